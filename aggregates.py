@@ -0,0 +1,168 @@
+"""Per-driver and per-facility totals for a run, as NumPy group-by reductions.
+
+aggregate() pulls the grouped trips' columns into arrays once: a driver code
+and export row per trip, the estimated cost and gross pay, and a code for
+each distinct facility sequence. Every total is then a bincount or unique
+over those arrays; the only Python-level work per value is reading it off
+the trip and splitting each distinct facility sequence once.
+
+The totals go into every driver's header context (see TOTAL_FIELDS) and
+into one summary workbook, SUMMARY_FILENAME, written next to the drivers'.
+The summary's total counts each export row once, so team trips shared in
+full between their drivers do not inflate it.
+"""
+import re
+from operator import attrgetter
+
+import numpy as np
+import openpyxl
+
+SUMMARY_FILENAME = "_summary.xlsx"
+
+# Header fields filled from the driver's totals.
+TOTAL_FIELDS = ("trip_count", "total_estimated_cost", "total_gross_pay")
+
+# "BOI2->BDU5-CART-CO" visits BOI2 then BDU5; "-CART-CO", "-NIT" and the
+# like qualify the stop rather than name another facility.
+_STOP_SEPARATOR = "->"
+_FACILITY_RE = re.compile(r"[^\s-]+")
+
+
+def facilities(sequence):
+    """Returns the distinct facility codes of a Facility Sequence, in order."""
+    codes = []
+    if not sequence:
+        return codes
+    for stop in str(sequence).split(_STOP_SEPARATOR):
+        match = _FACILITY_RE.search(stop)
+        if match and match.group() not in codes:
+            codes.append(match.group())
+    return codes
+
+
+def _amounts(values):
+    """Float array of values; blanks and non-numbers count as 0."""
+    try:
+        amounts = np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        amounts = np.array([value if isinstance(value, (int, float)) else np.nan for value in values], dtype=float)
+    return np.nan_to_num(amounts, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+class Aggregates:
+    """Totals of one run.
+
+    Driver arrays are in the order of drivers, facility arrays in the
+    order of facilities (sorted). driver_facility_trips holds
+    (driver index, facility index, trips) triples for the pairs that occur.
+    Team trips count once on each of their drivers' totals; export_totals
+    holds the TOTAL_FIELDS values over the export rows, each counted once.
+    """
+
+    def __init__(self, drivers, trip_count, estimated_cost, gross_pay, facilities, facility_trips, driver_facility_trips, export_totals):
+        self.drivers = drivers
+        self.trip_count = trip_count
+        self.estimated_cost = estimated_cost
+        self.gross_pay = gross_pay
+        self.facilities = facilities
+        self.facility_trips = facility_trips
+        self.driver_facility_trips = driver_facility_trips
+        self.export_totals = export_totals
+        self._index = {driver_name: index for index, driver_name in enumerate(drivers)}
+
+    def totals(self, driver_name):
+        """The driver's TOTAL_FIELDS values, for the header context."""
+        index = self._index[driver_name]
+        return {
+            "trip_count": int(self.trip_count[index]),
+            "total_estimated_cost": round(float(self.estimated_cost[index]), 2),
+            "total_gross_pay": round(float(self.gross_pay[index]), 2),
+        }
+
+
+def aggregate(trips_by_driver, export_trips):
+    """Computes the run's totals.
+
+    Args:
+        trips_by_driver: Dict of driver name to ingest.Trip records, as
+            returned by drivers.DriverIndex.regroup.
+        export_trips: The same trips as they are in the export, once per
+            row and with their amounts before any team split.
+
+    Returns:
+        An Aggregates.
+    """
+    drivers = list(trips_by_driver)
+    trips = [trip for driver_trips in trips_by_driver.values() for trip in driver_trips]
+    trip_count = np.fromiter(map(len, trips_by_driver.values()), dtype=np.int64, count=len(drivers))
+    driver_codes = np.repeat(np.arange(len(drivers)), trip_count)
+
+    estimated_cost = np.bincount(driver_codes, weights=_amounts(list(map(attrgetter("estimated_cost"), trips))), minlength=len(drivers))
+    gross_pay = np.bincount(driver_codes, weights=_amounts(list(map(attrgetter("gross_pay"), trips))), minlength=len(drivers))
+
+    sequences = np.array(list(map(attrgetter("facility_sequence"), trips)), dtype=object)
+    sequences[np.equal(sequences, None)] = ""
+    unique_sequences, sequence_codes = np.unique(sequences.astype(str), return_inverse=True)
+    sequence_codes = sequence_codes.reshape(-1)
+
+    # Each distinct sequence's facilities, flattened, with per-sequence offsets.
+    parsed = [facilities(sequence) for sequence in unique_sequences]
+    names = sorted({code for codes in parsed for code in codes})
+    facility_index = {name: index for index, name in enumerate(names)}
+    flat = np.fromiter((facility_index[code] for codes in parsed for code in codes), dtype=np.int64)
+    lengths = np.fromiter(map(len, parsed), dtype=np.int64, count=len(parsed))
+    starts = np.cumsum(lengths) - lengths
+
+    # One (trip, facility) pair per facility of every trip.
+    per_trip = lengths[sequence_codes]
+    pair_trips = np.repeat(np.arange(len(trips)), per_trip)
+    pair_facilities = flat[np.repeat(starts[sequence_codes], per_trip) + np.arange(per_trip.sum()) - np.repeat(np.cumsum(per_trip) - per_trip, per_trip)]
+    facility_count = max(len(names), 1)
+
+    # A team trip is on several drivers' lists; the facility totals count its export row once.
+    rows = np.fromiter(map(attrgetter("row_number"), trips), dtype=np.int64, count=len(trips))
+    visits = np.unique(rows[pair_trips] * facility_count + pair_facilities)
+    facility_trips = np.bincount(visits % facility_count, minlength=len(names))
+
+    pairs, pair_counts = np.unique(driver_codes[pair_trips] * facility_count + pair_facilities, return_counts=True)
+    driver_facility_trips = list(zip((pairs // facility_count).tolist(), (pairs % facility_count).tolist(), pair_counts.tolist()))
+
+    export_totals = {
+        "trip_count": len(export_trips),
+        "total_estimated_cost": round(float(_amounts(list(map(attrgetter("estimated_cost"), export_trips))).sum()), 2),
+        "total_gross_pay": round(float(_amounts(list(map(attrgetter("gross_pay"), export_trips))).sum()), 2),
+    }
+    return Aggregates(drivers, trip_count, estimated_cost, gross_pay, names, facility_trips, driver_facility_trips, export_totals)
+
+
+def summary_workbook(aggregates, period_fields):
+    """Builds the run's summary workbook.
+
+    Args:
+        aggregates: Aggregates of the run.
+        period_fields: (today, start_date, end_date) as formatted by
+            engine.period_fields.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    drivers_sheet = workbook.create_sheet("Drivers")
+    drivers_sheet.append(["Pay week", period_fields[1], period_fields[2]])
+    drivers_sheet.append([])
+    drivers_sheet.append(["Driver Name", "Trips", "Estimated Cost", "Gross Pay"])
+    for driver_name in aggregates.drivers:
+        totals = aggregates.totals(driver_name)
+        drivers_sheet.append([driver_name, totals["trip_count"], totals["total_estimated_cost"], totals["total_gross_pay"]])
+    export_totals = aggregates.export_totals
+    drivers_sheet.append(["Total", export_totals["trip_count"], export_totals["total_estimated_cost"], export_totals["total_gross_pay"]])
+    drivers_sheet.append([])
+    drivers_sheet.append(["The total counts each export row once; a team trip is on every one of its drivers' rows."])
+
+    facilities_sheet = workbook.create_sheet("Facilities")
+    facilities_sheet.append(["Facility", "Trips"])
+    for name, trips in zip(aggregates.facilities, aggregates.facility_trips.tolist()):
+        facilities_sheet.append([name, trips])
+
+    pairs_sheet = workbook.create_sheet("Driver Facilities")
+    pairs_sheet.append(["Driver Name", "Facility", "Trips"])
+    for driver, facility, trips in aggregates.driver_facility_trips:
+        pairs_sheet.append([aggregates.drivers[driver], aggregates.facilities[facility], trips])
+    return workbook
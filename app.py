@@ -1,122 +1,122 @@
-import pytz
 import streamlit as st
-import openpyxl
+import json
 import os
-from datetime import datetime, timedelta
-import zipfile
-
-def process_excel(input_file, template_file, output_dir):
-    workbook = openpyxl.load_workbook(input_file)
-    worksheet = workbook.active
-
-    target_columns = {"Trip ID": None, "Driver Name": None, "Facility Sequence": None, "Estimated Cost": None}
-
-    for header_cell in worksheet.iter_rows(min_row=2, values_only=True):
-        if header_cell:
-            for col_idx, value in enumerate(header_cell):
-                if value is not None:
-                    value_str = str(value)
-                    if value_str.strip() in target_columns:
-                        target_columns[value_str.strip()] = col_idx + 1
-
-    if not all(value for value in target_columns.values()):
-        raise ValueError(f"Missing target columns in input file: {', '.join(missing for missing in target_columns if not target_columns[missing])}")
-
-    processed_drivers = {}
-
-    start_row = 16
-    facility_row = 18
-    estimated_cost_row = 19
-    cell_offset = 5
-
-    for row_num, row in enumerate(worksheet.iter_rows(min_row=3, values_only=True), 3):
-        if row:
-            Trip_ID = row[target_columns["Trip ID"] - 1]
-            Driver_Name = row[target_columns["Driver Name"] - 1]
-            Facility_Sequence = row[target_columns["Facility Sequence"] - 1]
-            Estimated_Cost = row[target_columns["Estimated Cost"] - 1]
-
-            output_file = os.path.join(output_dir, f"{Driver_Name}.xlsx")
-
-            if Driver_Name not in processed_drivers:
-                processed_drivers[Driver_Name] = {'trip_row': start_row, 'facility_row': facility_row, 'estimated_cost_row': estimated_cost_row}
-                template_workbook = openpyxl.load_workbook(template_file)
-                template_worksheet = template_workbook.active
-
-               # Calculate start and end dates in Mountain Time
-                mountain_tz = pytz.timezone('MST')
-                today = datetime.now(mountain_tz)
-                start_date = today - timedelta(days=today.weekday())
-                end_date = start_date + timedelta(days=6)
-
-                            # Adjust to the nearest Saturday
-                if today.weekday() == 6:  # If today is Saturday
-                    start_date = today
-                else:
-                    start_date = today - timedelta(days=today.weekday() + 1)
-
-                end_date = start_date + timedelta(days=6)
-
-                # Populate date fields in the template
-                template_worksheet['D3'] = today.strftime('%m/%d/%Y')
-                template_worksheet['D6'] = start_date.strftime('%m/%d/%Y')
-                template_worksheet['D7'] = end_date.strftime('%m/%d/%Y')
-
-                template_worksheet['B11'] = Trip_ID
-                template_worksheet['D4'] = Driver_Name
-                template_worksheet['B13'] = Facility_Sequence
-                template_worksheet['B14'] = Estimated_Cost
-                template_workbook.save(output_file)
-            else:
-                existing_workbook = openpyxl.load_workbook(output_file)
-                driver_data = processed_drivers[Driver_Name]
-                current_trip_row = driver_data['trip_row']
-                current_facility_row = driver_data['facility_row']
-                current_estimated_cost_row = driver_data['estimated_cost_row']
-
-                existing_worksheet = existing_workbook.active
-                existing_worksheet[f"B{current_trip_row}"] = Trip_ID
-                existing_worksheet[f"B{current_facility_row}"] = Facility_Sequence
-                existing_worksheet[f"B{current_estimated_cost_row}"] = Estimated_Cost
-
-                driver_data['trip_row'] += cell_offset
-                driver_data['facility_row'] += cell_offset
-                driver_data['estimated_cost_row'] += cell_offset
-
-                existing_workbook.save(output_file)
-
-    return processed_drivers
+import time
+
+from drivers import TEAM_POLICIES
+from engine import DEFAULT_TIMEZONE
+from input_cache import default_cache as input_cache
+from jobs import CANCELLED, DONE, FAILED, QUEUED, RUNNING, default_queue
+from preflight import ERROR, Issue, describe
+
+# How often a page with an unfinished job re-checks its progress.
+POLL_SECONDS = 1
+
+def show_job(job):
+    if job.status == QUEUED:
+        st.info(f"Waiting for a free slot ({default_queue.position(job)} jobs ahead).")
+    elif job.status == RUNNING:
+        total = job.total or 0
+        st.progress(job.done / total if total else 0.0, text=f"{job.done} of {total} drivers written" if total else "Reading the input file...")
+    if job.status in (QUEUED, RUNNING):
+        if st.button("Cancel"):
+            job.cancel()
+        time.sleep(POLL_SECONDS)
+        st.rerun()
+
+    if job.status == CANCELLED:
+        st.warning("The job was cancelled.")
+    elif job.status == FAILED:
+        preflight = job.report and job.report.get("preflight")
+        if preflight and not preflight["ok"]:
+            st.error("The input file cannot be processed:")
+            for issue in preflight["issues"]:
+                if issue["severity"] == ERROR:
+                    st.error(describe(Issue(**issue)))
+        else:
+            st.error(f"The job failed: {job.error}")
+    if job.status != DONE:
+        return
+
+    for driver_name, error in job.driver_errors.items():
+        st.warning(f"Could not create the file for {driver_name}: {error}")
+
+    with open(job.zip_path, "rb") as f:
+        st.download_button("Download All Files", f.read(), file_name="output_files.zip")
+
+    st.success("Processing complete! Download the ZIP file above.")
+
+    run_report = job.report
+    st.subheader("Run report")
+    st.write(f"{run_report['counts']['rows']} rows, {run_report['counts']['drivers']} drivers, {run_report['counts']['rendered']} files rendered in {run_report['elapsed']:.2f}s")
+    st.table([{"stage": name, **stage} for name, stage in run_report["stages"].items()])
+    if os.path.exists(job.path("payments.xlsx")):
+        st.write(f"{run_report['counts']['unmatched_trips']} trips without a payment and {run_report['counts']['unmatched_payments']} payments without a trip; see _unmatched_trips.xlsx in the ZIP.")
+    for issue in (run_report.get("preflight") or {}).get("issues", ()):
+        st.warning(describe(Issue(**issue)))
+    for message, count in run_report["warnings"].items():
+        st.warning(f"{count} x {message}")
+    cache_stats = input_cache.stats()
+    st.caption(f"Parsed-input cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} entries ({cache_stats['bytes'] / 2**20:.1f} MiB)")
+    with st.expander("Full report"):
+        st.json(run_report)
+    st.download_button("Download Run Report", json.dumps(run_report, indent=2), file_name="run_report.json")
 
 def main():
     st.title("Excel Processor")
 
     uploaded_input_file = st.file_uploader("Upload Input File", type=["xlsx"])
     uploaded_template_file = st.file_uploader("Upload Template File", type=["xlsx"])
-
-    output_dir = st.text_input("Output Directory (Leave blank for default)", value="output_files")
+    uploaded_layout_file = st.file_uploader("Upload Layout File (optional)", type=["json"])
+    uploaded_payments_file = st.file_uploader("Upload Payments File (optional)", type=["xlsx"])
+
+    output_dir = st.text_input("Also save files to this directory (leave blank to skip)", value="")
+    incremental = st.checkbox("Only regenerate drivers whose trips changed (needs an output directory)")
+    fast = st.checkbox("Fast writer (simple templates: values, styles and merged cells only)")
+    team_policy = st.selectbox("Team trips (two drivers in Driver Name)", TEAM_POLICIES, format_func={"share": "Full amounts on each driver's file", "split": "Split amounts evenly between the drivers"}.get)
+    reference_date = st.date_input("Pay week containing (leave blank for the current week)", value=None)
+    timezone = st.text_input("Time zone for the current date", value=DEFAULT_TIMEZONE)
+    compresslevel = st.slider("ZIP compression level (0 = store only)", min_value=0, max_value=9, value=0)
+    workers = st.number_input("Worker processes", min_value=1, max_value=os.cpu_count() or 1, value=1)
+    profile = st.checkbox("Profile the run (cProfile; slower)")
 
     if st.button("Process"):
-        if uploaded_input_file is not None and uploaded_template_file is not None:
-            with open("input.xlsx", "wb") as f:
-                f.write(uploaded_input_file.read())
-            with open("template.xlsx", "wb") as f:
-                f.write(uploaded_template_file.read())
-
-            processed_drivers = process_excel("input.xlsx", "template.xlsx", output_dir)
-
-            # Create a ZIP file containing all output files
-            zip_filename = "output_files.zip"
-            with zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for driver_name in processed_drivers:
-                    output_file = os.path.join(output_dir, f"{driver_name}.xlsx")
-                    zipf.write(output_file)
+        if incremental and not output_dir:
+            st.warning("Incremental runs need an output directory to compare against.")
+        elif uploaded_input_file is not None and uploaded_template_file is not None:
+            # The job copies the uploads into its own workspace and runs in the background
+            layout = json.load(uploaded_layout_file) if uploaded_layout_file is not None else None
+            job = default_queue.submit(
+                uploaded_input_file.getvalue(),
+                uploaded_template_file.getvalue(),
+                uploaded_payments_file.getvalue() if uploaded_payments_file is not None else None,
+                output_dir=output_dir or None,
+                compresslevel=compresslevel,
+                profile=profile,
+                workers=int(workers),
+                incremental=incremental,
+                layout=layout,
+                fast=fast,
+                team_policy=team_policy,
+                reference_date=reference_date,
+                timezone=timezone,
+                validate=True,
+            )
+            # Keeping the job id in the URL lets a refreshed page find the job again
+            st.query_params["job"] = job.id
+        else:
+            st.warning("Please upload both input and template files.")
 
-            with open(zip_filename, "rb") as f:
-                st.download_button("Download All Files", f, file_name=zip_filename)
+    counts = default_queue.counts()
+    st.caption(f"{counts[RUNNING]} jobs running, {counts[QUEUED]} waiting")
 
-            st.success("Processing complete! Download the ZIP file above.")
+    job_id = st.query_params.get("job")
+    if job_id is not None:
+        job = default_queue.get(job_id)
+        if job is None:
+            st.warning("That job has expired or does not exist.")
         else:
-            st.warning("Please upload both input and template files.")
+            show_job(job)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
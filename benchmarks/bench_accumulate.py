@@ -0,0 +1,107 @@
+"""Compares the per-trip reload loop with the in-memory accumulation engine.
+
+Builds synthetic trips exports with a growing number of trips per driver,
+runs both implementations on each, checks that every output workbook holds
+the same cell values, and prints the timings.
+
+Usage:
+    python benchmarks/bench_accumulate.py [--drivers 20] [--trips 1 2 4 8 12]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine  # noqa: E402
+from ingest import iter_trips  # noqa: E402
+from layout import compile_layout, load_spec, next_free_rows  # noqa: E402
+from template_cache import TemplateCache  # noqa: E402
+
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "template", "payroll_template.xlsx")
+
+
+def reload_per_trip(input_file, template_file, output_dir):
+    """The original app.py loop: one load/save of the driver's file per trip."""
+    period = engine.pay_period()
+    template = TemplateCache().get(template_file)
+    plan = compile_layout(load_spec(), template.clone())
+    processed_drivers = {}
+
+    for trip in iter_trips(input_file):
+        output_file = os.path.join(output_dir, f"{trip.driver_name}.xlsx")
+
+        if trip.driver_name not in processed_drivers:
+            processed_drivers[trip.driver_name] = next_free_rows(plan, 1)
+            engine.render_driver(template, trip.driver_name, [trip], period, plan).save(output_file)
+        else:
+            workbook = openpyxl.load_workbook(output_file)
+            driver_data = processed_drivers[trip.driver_name]
+            worksheet = workbook.active
+            worksheet[f"B{driver_data['trip_row']}"] = trip.trip_id
+            worksheet[f"B{driver_data['facility_row']}"] = trip.facility_sequence
+            worksheet[f"B{driver_data['estimated_cost_row']}"] = trip.estimated_cost
+            # Pay fields are empty without a payment export, so only the rows move.
+            for key in driver_data:
+                if key.endswith('_row'):
+                    driver_data[key] += load_spec()["block_offset"]
+            workbook.save(output_file)
+
+    return processed_drivers
+
+
+def write_trips(path, drivers, trips_per_driver):
+    """Writes a trips export with the real two-row header layout."""
+    workbook = openpyxl.Workbook()
+    worksheet = workbook.active
+    worksheet.append(["Trips"])
+    worksheet.append(["Block ID", "Trip ID", "Facility Sequence", "Driver Name", "Estimated Cost"])
+    for trip in range(trips_per_driver):
+        for driver in range(drivers):
+            worksheet.append([None, f"T{driver:03d}{trip:03d}", "DEN5->OAK5", f"Driver {driver}", 100.0 + trip])
+    workbook.save(path)
+
+
+def cell_values(path):
+    worksheet = openpyxl.load_workbook(path).active
+    return [[cell.value for cell in row] for row in worksheet.iter_rows()]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drivers", type=int, default=20)
+    parser.add_argument("--trips", type=int, nargs="+", default=[1, 2, 4, 8, 12], help="At most 12, the blocks on one template sheet.")
+    args = parser.parse_args(argv)
+
+    print(f"{'trips/driver':>12} {'reload (s)':>11} {'engine (s)':>11} {'speedup':>8}")
+    for trips_per_driver in args.trips:
+        with tempfile.TemporaryDirectory() as workdir:
+            input_file = os.path.join(workdir, "trips.xlsx")
+            write_trips(input_file, args.drivers, trips_per_driver)
+            baseline_dir = os.path.join(workdir, "baseline")
+            engine_dir = os.path.join(workdir, "engine")
+            os.mkdir(baseline_dir)
+            os.mkdir(engine_dir)
+
+            expected, baseline_time = timed(reload_per_trip, input_file, TEMPLATE_FILE, baseline_dir)
+            actual, engine_time = timed(engine.process_excel, input_file, TEMPLATE_FILE, engine_dir)
+
+            assert actual == expected, "processed_drivers differs from the reload loop"
+            for name in sorted(os.listdir(baseline_dir)):
+                assert cell_values(os.path.join(baseline_dir, name)) == cell_values(os.path.join(engine_dir, name)), name
+
+        print(f"{trips_per_driver:>12} {baseline_time:>11.3f} {engine_time:>11.3f} {baseline_time / engine_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Checks the fast writer against the openpyxl path and times both.
+
+Renders every driver of a trips export (the sample in input/ by default)
+plus a set of awkward synthetic values through both writers, asserts that
+every package part except the docProps/core.xml timestamps is
+byte-identical, and prints the time per file.
+
+Usage:
+    python benchmarks/bench_fast_writer.py [--input input/trips.xlsx] [--repeat 50]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine  # noqa: E402
+from fast_writer import compile_skeleton  # noqa: E402
+from ingest import Trip, iter_trips  # noqa: E402
+from layout import compile_layout, load_spec  # noqa: E402
+from template_cache import TemplateCache  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_FILE = os.path.join(ROOT, "template", "payroll_template.xlsx")
+
+AWKWARD_TRIPS = [
+    Trip("  padded  ", None, "A&B <C>", 0.1 + 0.2, 3),
+    Trip(12345678901234567, None, True, -0.0, 4),
+    Trip("=1+2", None, "", 1e-20, 5),
+    Trip("1122KYRNF", None, None, None, 6),
+]
+
+
+def parts(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return {name: archive.read(name) for name in archive.namelist() if name != "docProps/core.xml"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", default=os.path.join(ROOT, "input", "trips.xlsx"))
+    parser.add_argument("--template", default=TEMPLATE_FILE)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    template = TemplateCache().get(args.template)
+    plan = compile_layout(load_spec(None, args.template, template.clone()), template.clone())
+    skeleton = compile_skeleton(template, plan)
+    period = engine.pay_period()
+
+    drivers = {name: trips for name, trips in engine.group_trips(iter_trips(args.input)).items() if len(trips) <= plan.capacity}
+    drivers["Awkward & <Values>"] = AWKWARD_TRIPS
+
+    for name, trips in drivers.items():
+        _, expected = engine.render_file(template, name, trips, period, plan)
+        actual = skeleton.render(engine.header_context(name, period), trips)
+        assert parts(actual) == parts(expected), f"fast writer output differs for {name!r}"
+    print(f"{len(drivers)} drivers: fast writer output matches openpyxl")
+
+    timings = {}
+    for label, use_skeleton in (("openpyxl", None), ("fast", skeleton)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for name, trips in drivers.items():
+                engine.render_file(template, name, trips, period, plan, use_skeleton)
+        timings[label] = (time.perf_counter() - start) / (args.repeat * len(drivers))
+        print(f"{label:>9}: {timings[label] * 1000:.2f} ms/file")
+    print(f"  speedup: {timings['openpyxl'] / timings['fast']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
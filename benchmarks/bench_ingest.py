@@ -0,0 +1,108 @@
+"""Compares the full in-memory trips loader with streaming ingestion.
+
+Writes a synthetic trips export (see synthetic.py) with the real wide header
+layout, then reads it back with the full loader, openpyxl's read-only mode
+and the column-projected reader behind iter_trips, and prints wall time and
+peak RSS growth for each. Each loader runs in its own forked process so the
+memory figures do not mix.
+
+Usage:
+    python benchmarks/bench_ingest.py [--rows 20000 100000 500000]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import TARGET_COLUMNS, find_header, iter_trips  # noqa: E402
+from synthetic import write_trips  # noqa: E402
+
+
+def full_loader(input_file):
+    """Today's loader: full cell graph, header scan over every row from row 2."""
+    worksheet = openpyxl.load_workbook(input_file).active
+    columns = {}
+    for row in worksheet.iter_rows(min_row=2, values_only=True):
+        for col_idx, value in enumerate(row):
+            if value is not None and str(value).strip() in TARGET_COLUMNS:
+                columns[str(value).strip()] = col_idx
+    for row in worksheet.iter_rows(min_row=3, values_only=True):
+        yield tuple(row[columns[name]] for name in TARGET_COLUMNS)
+
+
+def read_only_loader(input_file):
+    """openpyxl read-only mode: every cell of every row is decoded."""
+    workbook = openpyxl.load_workbook(input_file, read_only=True)
+    worksheet = workbook.active
+    worksheet.reset_dimensions()
+    rows = worksheet.iter_rows(values_only=True)
+    _, columns = find_header(rows)
+    for row in rows:
+        if row:
+            yield tuple(row[columns[name]] for name in TARGET_COLUMNS)
+    workbook.close()
+
+
+def streaming_loader(input_file):
+    for trip in iter_trips(input_file):
+        yield tuple(trip)[:4]
+
+
+def _drain(loader, input_file, conn):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    count = 0
+    first = None
+    for record in loader(input_file):
+        if first is None:
+            first = record
+        count += 1
+    elapsed = time.perf_counter() - start
+    peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024
+    conn.send((count, first, elapsed, peak))
+
+
+def measure(loader, input_file):
+    """Drains a loader in a forked child; returns (rows, first, seconds, peak RSS growth MiB)."""
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.get_context("fork").Process(target=_drain, args=(loader, input_file, child_conn))
+    process.start()
+    # Only the child holds the sending end now, so recv() sees EOF if it dies.
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        result = None
+    process.join()
+    if result is None or process.exitcode != 0:
+        raise RuntimeError(f"Loader {loader.__name__} failed on {input_file} (exit code {process.exitcode})")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[2000, 20000])
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>8} {'loader':>10} {'time (s)':>9} {'RSS (MiB)':>11}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as workdir:
+            input_file = os.path.join(workdir, "trips.xlsx")
+            write_trips(input_file, rows, drivers=200)
+            results = {}
+            for name, loader in (("full", full_loader), ("read-only", read_only_loader), ("streaming", streaming_loader)):
+                count, first, elapsed, peak = measure(loader, input_file)
+                results[name] = (count, first)
+                print(f"{rows:>8} {name:>10} {elapsed:>9.2f} {peak:>11.1f}")
+            assert results["full"] == results["read-only"] == results["streaming"], "loaders disagree"
+
+
+if __name__ == "__main__":
+    main()
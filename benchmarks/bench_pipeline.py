@@ -0,0 +1,163 @@
+"""Times process_excel end to end on synthetic exports at several scales.
+
+For each row count, writes a synthetic trips export, the matching payment
+export and a template (see synthetic.py), then runs process_excel on them
+in a fresh process with a RunReport, a ZipSink and an output directory. The
+per-stage timings (ingestion, grouping, rendering, saving, zipping, disk
+writes), the run's counts and the process's peak RSS are printed and
+written to a JSON file together with the git commit, Python version and
+options, so two versions' files can be compared stage by stage.
+
+Needs nothing beyond requirements.txt and no network access.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--rows 1000 10000 100000 1000000] [--output bench_pipeline.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synthetic  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def _run(workdir, options, conn):
+    """Runs one process_excel in this (fresh) process and sends back the results."""
+    from engine import process_excel
+    from instrument import RunReport
+    from sinks import ZipSink
+
+    report = RunReport()
+    zip_sink = ZipSink(compresslevel=options["compresslevel"])
+    process_excel(
+        os.path.join(workdir, "trips.xlsx"),
+        os.path.join(workdir, "payroll_template.xlsx"),
+        os.path.join(workdir, "output"),
+        workers=options["workers"],
+        sinks=[zip_sink],
+        report=report,
+        fast=options["fast"],
+        payments=os.path.join(workdir, "payments.xlsx") if options["payments"] else None,
+        team_policy=options["team_policy"],
+    )
+    start = time.perf_counter()
+    data = zip_sink.getvalue()
+    zip_close = time.perf_counter() - start
+
+    run = report.to_dict()
+    run["zip_close_seconds"] = zip_close
+    run["zip_bytes"] = len(data)
+    # ru_maxrss is in KiB on Linux.
+    run["peak_rss_mib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    run["workers_peak_rss_mib"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    conn.send(run)
+
+
+def measure(workdir, options):
+    """Runs process_excel on the files in workdir in a spawned process, so
+    each scale's memory figures start from a clean interpreter."""
+    context = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = context.Pipe()
+    process = context.Process(target=_run, args=(workdir, options, child_conn))
+    process.start()
+    # Only the child holds the sending end now, so recv() sees EOF if it dies.
+    child_conn.close()
+    try:
+        run = parent_conn.recv()
+    except EOFError:
+        run = None
+    process.join()
+    if run is None or process.exitcode != 0:
+        raise RuntimeError(f"Benchmark run in {workdir} failed (exit code {process.exitcode})")
+    return run
+
+
+def bench(rows, options):
+    drivers = max(1, rows // options["rows_per_driver"])
+    generate = dict(drivers=drivers, team_ratio=options["team_ratio"], width=options["width"], seed=options["seed"])
+    with tempfile.TemporaryDirectory(dir=options["workdir"]) as workdir:
+        start = time.perf_counter()
+        synthetic.write_trips(os.path.join(workdir, "trips.xlsx"), rows, **generate)
+        if options["payments"]:
+            synthetic.write_payments(os.path.join(workdir, "payments.xlsx"), rows, **generate)
+        synthetic.write_template(os.path.join(workdir, "payroll_template.xlsx"))
+        generate_seconds = time.perf_counter() - start
+
+        run = measure(workdir, options)
+        run["rows"] = rows
+        run["generated_drivers"] = drivers
+        run["generate_seconds"] = generate_seconds
+        run["input_bytes"] = os.path.getsize(os.path.join(workdir, "trips.xlsx"))
+        run["rows_per_second"] = rows / run["elapsed"] if run["elapsed"] else None
+        run["files_per_second"] = run["counts"]["rendered"] / run["elapsed"] if run["elapsed"] else None
+    return run
+
+
+def print_run(run):
+    counts = run["counts"]
+    print(
+        f"{run['rows']:>9} rows  {counts['drivers']:>6} drivers  {run['elapsed']:8.2f}s  "
+        f"{run['rows_per_second']:10.0f} rows/s  {run['files_per_second']:8.1f} files/s  peak RSS {run['peak_rss_mib']:8.1f} MiB"
+    )
+    for name, stage in run["stages"].items():
+        print(f"    {name:>16}: {stage['seconds']:9.3f}s  {stage['calls']:8d} calls  {stage['bytes'] / 2**20:9.2f} MiB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000], help="Trips per export; 1000000 takes a while.")
+    parser.add_argument("--rows-per-driver", type=int, default=25, help="Trips per distinct driver (default 25).")
+    parser.add_argument("--team-ratio", type=float, default=0.2, help="Share of team trips (default 0.2).")
+    parser.add_argument("--width", type=int, default=50, help="Trips export columns (default 50, as exported).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="process_excel rendering processes (default 1).")
+    parser.add_argument("--fast", action="store_true", help="Use the fast writer.")
+    parser.add_argument("--no-payments", dest="payments", action="store_false", help="Skip the payment export and join.")
+    parser.add_argument("--team-policy", default="share")
+    parser.add_argument("--compresslevel", type=int, default=0)
+    parser.add_argument("--workdir", help="Directory for the generated files and output (default: the system temp dir).")
+    parser.add_argument("--output", default="bench_pipeline.json", help="JSON results file (default bench_pipeline.json).")
+    args = parser.parse_args(argv)
+
+    options = {key: value for key, value in vars(args).items() if key not in ("rows", "output")}
+    results = {
+        "benchmark": "pipeline",
+        "commit": git_commit(),
+        "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "options": options,
+        "runs": [],
+    }
+    for rows in args.rows:
+        run = bench(rows, options)
+        print_run(run)
+        results["runs"].append(run)
+        # Written after every scale, so a long run that is stopped keeps what it measured.
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""Synthetic trips exports, payment exports and payroll templates.
+
+The exports follow the real files' layout: the trips export has a title row
+above the 50-column header (a dozen "Stop N ..." columns per stop), the
+payment export a "Payment Summary" sheet before its "Payment Details". Rows,
+drivers, the share of team trips and the column count are configurable,
+and the same seed always gives the same files.
+
+The exports' sheet XML is written straight into the zip with shared
+strings, the way Excel stores them, because openpyxl's write-only mode is
+too slow to produce a million-row export in reasonable time. Templates are
+small and go through openpyxl.
+
+Usage:
+    python benchmarks/synthetic.py OUTPUT_DIR [--rows 10000] [--drivers 400] [--team-ratio 0.2] [--width 50]
+"""
+import argparse
+import os
+import random
+import string
+import zipfile
+from xml.sax.saxutils import escape
+
+import openpyxl
+from openpyxl.utils.cell import get_column_letter
+
+TRIPS_TITLE = "Trips-3"
+
+TRIPS_COLUMNS = [
+    "Block ID", "Trip ID", "Block/Trip", "Trip Stage", "Load ID", "Facility Sequence",
+    "Load Execution Status", "Transit Operator Type", "Driver Name", "Equipment Type",
+    "Trailer ID", "Tractor Vehicle ID", "Estimate Distance", "Unit", "Rate Type",
+    "Estimated Cost", "Currency", "Truck Filter", "Operator ID", "Shipper Account",
+    "Sub Carrier", "CR_ID", "Port Appointment Date", "Port Appointment Time", "Port Pin Code",
+    "Spot Work", "Contract Type", "Contract ID",
+]
+
+# Spelled as in the real export, double spaces included.
+STOP_FIELDS = [
+    "", " UTC Offset", " Planned Arrival Date", " Planned Arrival Time", "  Actual Arrival Date",
+    "  Actual Arrival Time", "  Planned Departure Date", "  Planned Departure Time",
+    " Actual Departure Date", " Actual Departure Time", " Container ID",
+]
+
+# Trips columns up to Currency; the engine needs Driver Name and Estimated Cost.
+MIN_WIDTH = 17
+
+PAYMENT_COLUMNS = [
+    "Invoice Number", "Block ID", "Trip ID", "Load ID", "Start Date", "End Date", "Route",
+    "Operator Type", "Equipment", "Distance (Mi)", "Item Type", "Program Type", "Base Rate",
+    "Fuel Surcharge", "Tolls", "Detention", "TONU", "Others", "Gross Pay", "Comments",
+]
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml"
+
+_STYLES = (
+    f'<styleSheet xmlns="{_MAIN_NS}"><fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles></styleSheet>'
+)
+
+# Rows are written to the sheet part this many at a time.
+_BATCH_ROWS = 1000
+
+
+def trips_header(width=50):
+    """The trips export header, cut or extended with more stops to width columns."""
+    if width < MIN_WIDTH:
+        raise ValueError(f"width must be at least {MIN_WIDTH}")
+    header = list(TRIPS_COLUMNS)
+    stop = 0
+    while len(header) < width:
+        stop += 1
+        header.extend(f"Stop {stop}{field}" for field in STOP_FIELDS)
+    return header[:width]
+
+
+def _code(number, length=8):
+    """Base-36 code like the export's Trip and Load IDs ("1122KYRNF")."""
+    digits = string.digits + string.ascii_uppercase
+    code = ""
+    for _ in range(length):
+        number, digit = divmod(number, 36)
+        code = digits[digit] + code
+    return code
+
+
+def trip_id(row):
+    return "1" + _code(row * 7919 + 104729)
+
+
+def block_id(block):
+    return "B-" + _code(block * 104729 + 7919)
+
+
+def driver_names(drivers):
+    return [f"Driver {number:05d}" for number in range(drivers)]
+
+
+def facility_codes(count=60):
+    rng = random.Random(count)
+    return [f"{''.join(rng.choices(string.ascii_uppercase, k=3))}{rng.randint(1, 9)}" for _ in range(count)]
+
+
+class _SharedStrings:
+    def __init__(self):
+        self.index = {}
+
+    def __call__(self, text):
+        index = self.index.get(text)
+        if index is None:
+            index = self.index[text] = len(self.index)
+        return index
+
+    def xml(self):
+        items = "".join(f"<si><t>{escape(text)}</t></si>" for text in self.index)
+        return f'<sst xmlns="{_MAIN_NS}" count="{len(self.index)}" uniqueCount="{len(self.index)}">{items}</sst>'
+
+
+def _row_xml(number, values, letters, shared):
+    cells = []
+    for letter, value in zip(letters, values):
+        if value is None:
+            continue
+        if isinstance(value, str):
+            cells.append(f'<c r="{letter}{number}" t="s"><v>{shared(value)}</v></c>')
+        else:
+            cells.append(f'<c r="{letter}{number}"><v>{value!r}</v></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+def write_workbook(path, sheets):
+    """Writes an xlsx file from (sheet name, iterable of row value lists) pairs.
+
+    Strings go into the shared strings table; None leaves the cell out.
+    Rows are streamed, so the iterables can be generators of any length.
+    """
+    shared = _SharedStrings()
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for number, (_, rows) in enumerate(sheets, 1):
+            with archive.open(f"xl/worksheets/sheet{number}.xml", "w", force_zip64=True) as part:
+                part.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<worksheet xmlns="{_MAIN_NS}"><sheetData>'.encode())
+                letters = []
+                batch = []
+                for row_number, values in enumerate(rows, 1):
+                    while len(letters) < len(values):
+                        letters.append(get_column_letter(len(letters) + 1))
+                    batch.append(_row_xml(row_number, values, letters, shared))
+                    if len(batch) == _BATCH_ROWS:
+                        part.write("".join(batch).encode())
+                        batch = []
+                part.write(("".join(batch) + "</sheetData></worksheet>").encode())
+
+        names = [name for name, _ in sheets]
+        count = len(names)
+        archive.writestr("xl/sharedStrings.xml", shared.xml())
+        archive.writestr("xl/styles.xml", _STYLES)
+        archive.writestr("xl/workbook.xml", (
+            f'<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}"><sheets>'
+            + "".join(f'<sheet name="{escape(name)}" sheetId="{number}" r:id="rId{number}"/>' for number, name in enumerate(names, 1))
+            + "</sheets></workbook>"
+        ))
+        archive.writestr("xl/_rels/workbook.xml.rels", (
+            f'<Relationships xmlns="{_PKG_REL_NS}">'
+            + "".join(f'<Relationship Id="rId{number}" Type="{_REL_NS}/worksheet" Target="worksheets/sheet{number}.xml"/>' for number in range(1, count + 1))
+            + f'<Relationship Id="rId{count + 1}" Type="{_REL_NS}/sharedStrings" Target="sharedStrings.xml"/>'
+            + f'<Relationship Id="rId{count + 2}" Type="{_REL_NS}/styles" Target="styles.xml"/>'
+            + "</Relationships>"
+        ))
+        archive.writestr("_rels/.rels", (
+            f'<Relationships xmlns="{_PKG_REL_NS}">'
+            f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/></Relationships>'
+        ))
+        archive.writestr("[Content_Types].xml", (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            f'<Override PartName="/xl/workbook.xml" ContentType="{_CONTENT_TYPE}.sheet.main+xml"/>'
+            + "".join(f'<Override PartName="/xl/worksheets/sheet{number}.xml" ContentType="{_CONTENT_TYPE}.worksheet+xml"/>' for number in range(1, count + 1))
+            + f'<Override PartName="/xl/sharedStrings.xml" ContentType="{_CONTENT_TYPE}.sharedStrings+xml"/>'
+            f'<Override PartName="/xl/styles.xml" ContentType="{_CONTENT_TYPE}.styles+xml"/></Types>'
+        ))
+
+
+def _trip_rows(rows, drivers, team_ratio, width, seed):
+    """Yields (row values, Block ID, Load ID, Estimated Cost) for every trip."""
+    rng = random.Random(seed)
+    names = driver_names(drivers)
+    facilities = facility_codes()
+    suffixes = ["", "", "", "-NIT", "-DAY", "-CART-CO"]
+    dates = ["11/02/2024", "11/03/2024", "11/04/2024", "11/05/2024"]
+    times = ["07:45", "08:30", "12:00", "15:24", "21:10"]
+    stop_count = max(0, width - len(TRIPS_COLUMNS) + len(STOP_FIELDS) - 1) // len(STOP_FIELDS)
+    block = None
+    for row in range(rows):
+        # About one trip in ten belongs to a multi-trip block.
+        if block is None and rng.random() < 0.03:
+            block, block_left = block_id(row), rng.randint(2, 5)
+        stops = rng.sample(facilities, 2)
+        team = rng.random() < team_ratio
+        driver = rng.choice(names)
+        if team:
+            partner = rng.choice(names)
+            driver = f"{driver};{partner}" if partner != driver else driver
+        cost = round(rng.uniform(50, 4000), 2)
+        trip = trip_id(row)
+        values = [
+            block, trip, "Trip", "Completed", trip, f"{stops[0]}->{stops[1]}{rng.choice(suffixes)}",
+            "Completed", "Team Driver" if team else "Solo", driver, "53' Trailer",
+            f"V{rng.randint(100000, 999999)}", f"BL{rng.randint(1000, 9999)}", round(rng.uniform(1, 2000), 2),
+            "mi", "PER_LOAD", cost, "USD", None, None, "OutboundAmazonManaged", "AZNG", None,
+            None, None, None, "Yes", None, None,
+        ]
+        for stop in range(stop_count):
+            day = rng.choice(dates)
+            values.extend([
+                stops[stop % 2], -7 - stop % 2, day, rng.choice(times), day, rng.choice(times),
+                day, rng.choice(times), day, rng.choice(times), None,
+            ])
+        yield values[:width], block, trip, cost
+        if block is not None:
+            block_left -= 1
+            if not block_left:
+                block = None
+
+
+def write_trips(path, rows, drivers=None, team_ratio=0.2, width=50, seed=0):
+    """Writes a synthetic trips export.
+
+    Args:
+        path: xlsx file to write.
+        rows: Number of trips.
+        drivers: Number of distinct drivers; defaults to one per 25 trips.
+        team_ratio: Share of trips driven by a team ("A;B" in Driver Name).
+        width: Number of columns, at least MIN_WIDTH; beyond the real 50
+            more "Stop N" column groups are added.
+        seed: Random seed; the same arguments always give the same file.
+    """
+    header = trips_header(width)
+    drivers = drivers or max(1, rows // 25)
+
+    def sheet_rows():
+        yield [TRIPS_TITLE]
+        yield header
+        for values, _, _, _ in _trip_rows(rows, drivers, team_ratio, width, seed):
+            yield values
+
+    write_workbook(path, [(f"Sheet 1 - {TRIPS_TITLE}", sheet_rows())])
+
+
+def write_payments(path, rows, drivers=None, team_ratio=0.2, width=50, seed=0, paid_ratio=0.98, stray_ratio=0.01):
+    """Writes the payment export matching write_trips() with the same arguments.
+
+    paid_ratio of the trips get a LOAD row with their Load ID, every block
+    a block-level row with its Block ID, and stray_ratio * rows payments
+    name loads that are not in the trips export.
+    """
+    drivers = drivers or max(1, rows // 25)
+    rng = random.Random(seed + 1)
+    invoice = "AZNG" + _code(seed, 32)
+
+    def payment(block, trip, load, item, base, fuel):
+        tolls = round(rng.choice([0.0, 0.0, 0.0, rng.uniform(5, 60)]), 2)
+        gross = round(base + fuel + tolls, 2)
+        return [
+            invoice, block, trip, load, "Nov 2, 2024", "Nov 3, 2024", "", "Solo", "FIFTY_THREE_FOOT_TRUCK",
+            round(rng.uniform(1, 2000), 2), f"{item} - COMPLETED", "Load Board", base, fuel, tolls, 0.0, 0.0, 0.0,
+            gross, f"{item} - COMPLETED",
+        ]
+
+    def detail_rows():
+        yield PAYMENT_COLUMNS
+        blocks = set()
+        for _, block, load, cost in _trip_rows(rows, drivers, team_ratio, width, seed):
+            if block is not None and block not in blocks:
+                blocks.add(block)
+                yield payment(block, None, None, "BLOCK", round(rng.uniform(50, 500), 2), 0.0)
+            if rng.random() < paid_ratio:
+                fuel = round(cost * rng.uniform(0.05, 0.15), 2)
+                yield payment(None, None, load, "LOAD", round(cost - fuel, 2), fuel)
+        for stray in range(int(rows * stray_ratio)):
+            yield payment(None, None, "9" + _code(stray), "LOAD", round(rng.uniform(50, 500), 2), 0.0)
+
+    summary = [[], [None, "Carrier:", None, "Synthetic Carrier LLC"], [None, "SCAC:", None, "SYNTH"]]
+    write_workbook(path, [("Payment Summary", summary), ("Payment Details", detail_rows())])
+
+
+def write_template(path, blocks=12):
+    """Writes a payroll template shaped like template/payroll_template.xlsx.
+
+    It fits the built-in layout (layout.DEFAULT_SPEC): header cells D3 to
+    D7, one trip block every 5 rows from row 11, and a totals row below the
+    last of the blocks trip blocks, so the layout's capacity is blocks.
+    """
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Sheet 1"
+    sheet["C1"] = "Pay statement no. # 0 "
+    for cell, label in (("C3", "Date:"), ("C4", "Driver:"), ("C5", "E-Mail:"), ("C6", "Search from:"), ("C7", "Search to:"), ("C8", "Truck #")):
+        sheet[cell] = label
+    sheet["D5"] = sheet["D8"] = "XXX"
+    sheet["A10"] = "Trips"
+    sheet["D10"] = "Percentage "
+    for block in range(blocks):
+        row = 11 + block * 5
+        for offset, label in enumerate(("Load #:", "Pick-Up:", "Delivery:", "Rate:")):
+            sheet.cell(row=row + offset, column=1, value=label)
+    total_row = 10 + blocks * 5
+    sheet.cell(row=total_row, column=3, value="GRAND TOTAL")
+    sheet.cell(row=total_row, column=4, value=f"=SUM(C11:C{total_row - 1})")
+    workbook.save(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output_dir")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--drivers", type=int, help="Distinct drivers; defaults to one per 25 trips.")
+    parser.add_argument("--team-ratio", type=float, default=0.2)
+    parser.add_argument("--width", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    options = dict(drivers=args.drivers, team_ratio=args.team_ratio, width=args.width, seed=args.seed)
+    write_trips(os.path.join(args.output_dir, "trips.xlsx"), args.rows, **options)
+    write_payments(os.path.join(args.output_dir, "payments.xlsx"), args.rows, **options)
+    write_template(os.path.join(args.output_dir, "payroll_template.xlsx"))
+
+
+if __name__ == "__main__":
+    main()
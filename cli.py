@@ -0,0 +1,214 @@
+"""Headless batch runner for payroll files.
+
+Processes one or more trips exports against a payroll template without the
+Streamlit UI, e.g. from cron:
+
+    python cli.py "input/*.xlsx" --template template/payroll_template.xlsx --output-dir output_files --workers 8
+
+With a single input file the workbooks are written straight into the output
+directory (and the root of the ZIP); with several, each export gets a
+subdirectory named after it.
+
+The old per-layout scripts are thin wrappers around this runner; script.py,
+script3.py and script4.py are kept, one per distinct set of options. The
+removed script2.py and script5.py ran the same options as script.py and
+script4.py respectively:
+
+    python script.py    # cli.py ... --trip-ids-only --no-dates
+    python script3.py   # cli.py ... --trip-ids-only --no-dates --max-trips 6
+    python script4.py   # cli.py ... --no-dates
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+import zipfile
+
+from openpyxl.utils.exceptions import InvalidFileException
+
+from drivers import TEAM_POLICIES, DriverIndex
+from engine import DEFAULT_TIMEZONE, process_excel
+from input_cache import InputCache
+from instrument import RunReport, profiled
+from layout import compile_layout, load_spec
+from payments import index_payments
+from preflight import describe, preflight
+from sinks import PrefixedSink, ZipSink
+from template_cache import default_cache
+
+# What reading a file that is not a usable xlsx export can raise: a .csv
+# matched by a glob (InvalidFileException), a zip that is not a workbook
+# (KeyError, BadZipFile), a missing header (ValueError).
+INPUT_ERRORS = (OSError, ValueError, KeyError, zipfile.BadZipFile, InvalidFileException)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Create one payroll workbook per driver from trips exports.")
+    parser.add_argument("inputs", nargs="+", help="Trips export paths or glob patterns.")
+    parser.add_argument("--template", required=True, help="Payroll template workbook.")
+    parser.add_argument("--output-dir", help="Directory to save the workbooks in.")
+    parser.add_argument("--zip", help="Also write every workbook into this ZIP file.")
+    parser.add_argument("--compresslevel", type=int, default=0, choices=range(10), help="ZIP compression level; 0 stores (default).")
+    parser.add_argument("--workers", type=int, default=1, help="Rendering processes; 0 uses one per CPU (default 1).")
+    parser.add_argument("--chunksize", type=int, help="Drivers sent to a worker per task.")
+    parser.add_argument("--fast", action="store_true", help="Patch workbooks straight from a compiled template skeleton when the template allows it.")
+    parser.add_argument("--incremental", action="store_true", help="Only re-render drivers whose trips changed.")
+    parser.add_argument("--cache-dir", help="Keep parsed exports in this directory, so re-running on the same files skips reading them.")
+    parser.add_argument("--payments", help="Carrier payment export to join actual pay from; unmatched trips go to a separate report.")
+    parser.add_argument("--week-of", help="Date (YYYY-MM-DD) in the pay week to write; defaults to the current week.")
+    parser.add_argument("--timezone", default=DEFAULT_TIMEZONE, help=f"Time zone the current date is taken in (default {DEFAULT_TIMEZONE}).")
+    parser.add_argument("--team-policy", default="share", choices=TEAM_POLICIES, help="Give each driver of a team trip its full amounts (share, default) or an even split of them (split).")
+    parser.add_argument("--validate", action="store_true", help="Check every input before rendering and skip those with errors.")
+    parser.add_argument("--check", action="store_true", help="Only check the inputs and print what was found; nothing is rendered.")
+
+    instrumentation = parser.add_argument_group("instrumentation")
+    instrumentation.add_argument("--report", help="Write a JSON run report with per-stage timings for every input to this file.")
+    instrumentation.add_argument("--profile", action="store_true", help="Run each input under cProfile and add the top functions to the report.")
+    instrumentation.add_argument("--trace-memory", action="store_true", help="Trace allocations with tracemalloc and add the peak to the report.")
+
+    layout = parser.add_argument_group("layout")
+    layout.add_argument("--layout", help="JSON layout spec; defaults to <template>.layout.json, the template's defined names, or the built-in layout.")
+    layout.add_argument("--max-trips", type=int, help="Trip blocks per sheet; further trips continue on extra sheets.")
+    layout.add_argument("--trip-ids-only", action="store_true", help="Write only Trip IDs, not facilities and costs.")
+    layout.add_argument("--no-dates", action="store_true", help="Leave the date fields of the template untouched.")
+    return parser
+
+
+def expand_inputs(patterns):
+    """Expands glob patterns into a sorted, de-duplicated list of files."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def check(inputs, spec, args):
+    """Runs preflight on every input and prints its issues; 1 if any has errors."""
+    plan = compile_layout(spec, default_cache.clone(args.template))
+    reports = {}
+    failures = 0
+    for input_file in inputs:
+        report = preflight(input_file, plan, driver_index=DriverIndex(args.team_policy))
+        reports[input_file] = report.to_dict()
+        status = "ok" if report.ok else "rejected"
+        print(f"{input_file}: {status}: {report.rows} rows, {report.drivers} drivers, checked in {report.seconds:.3f}s")
+        for issue in report.issues:
+            print(f"  {issue.severity}: {describe(issue)}")
+        if not report.ok:
+            failures += 1
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(reports, f, indent=2)
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s")
+
+    inputs = expand_inputs(args.inputs)
+    if not inputs:
+        print("No input files matched.", file=sys.stderr)
+        return 2
+    if not args.output_dir and not args.zip and not args.check:
+        print("Give --output-dir, --zip or both.", file=sys.stderr)
+        return 2
+
+    spec = load_spec(args.layout, args.template, default_cache.clone(args.template))
+    if args.max_trips:
+        spec["capacity"] = args.max_trips
+    if args.trip_ids_only:
+        spec["block"] = {cell: field for cell, field in spec["block"].items() if field == "trip_id"}
+    if args.no_dates:
+        spec["header"] = {cell: field for cell, field in spec["header"].items() if field == "driver_name"}
+    if args.check:
+        return check(inputs, spec, args)
+    input_cache = InputCache(directory=args.cache_dir) if args.cache_dir else None
+
+    # Indexed once and joined against every input.
+    payments = None
+    if args.payments:
+        try:
+            payments = input_cache.get(args.payments, index_payments, "payments") if input_cache else index_payments(args.payments)
+        except INPUT_ERRORS as exc:
+            print(f"{args.payments}: cannot read payments: {exc}", file=sys.stderr)
+            return 2
+    zip_sink = ZipSink(compresslevel=args.compresslevel) if args.zip else None
+    totals = {"rows": 0, "drivers": 0, "rendered": 0, "bytes": 0}
+    reports = {}
+    failures = 0
+    started = time.perf_counter()
+
+    for input_file in inputs:
+        output_dir = args.output_dir
+        sinks = [zip_sink] if zip_sink else []
+        if len(inputs) > 1:
+            name = os.path.splitext(os.path.basename(input_file))[0]
+            if output_dir:
+                output_dir = os.path.join(output_dir, name)
+            sinks = [PrefixedSink(sink, name) for sink in sinks]
+
+        report = RunReport()
+        try:
+            with profiled(report, cprofile=args.profile, memory=args.trace_memory):
+                processed_drivers = process_excel(
+                    input_file, args.template, output_dir,
+                    template_cache=default_cache,
+                    workers=args.workers or None,
+                    chunksize=args.chunksize,
+                    sinks=sinks,
+                    incremental=args.incremental,
+                    layout=spec,
+                    report=report,
+                    fast=args.fast,
+                    payments=payments,
+                    input_cache=input_cache,
+                    team_policy=args.team_policy,
+                    reference_date=args.week_of,
+                    timezone=args.timezone,
+                    validate=args.validate,
+                )
+        except INPUT_ERRORS as exc:
+            failures += 1
+            print(f"{input_file}: skipped: {type(exc).__name__}: {exc}", file=sys.stderr)
+            continue
+        for driver_name, result in processed_drivers.items():
+            if 'error' in result:
+                failures += 1
+                print(f"{input_file}: could not create the file for {driver_name}: {result['error']}", file=sys.stderr)
+        reports[input_file] = report.to_dict()
+        counts = report.counts
+        for key in totals:
+            totals[key] += counts[key]
+        print(f"{input_file}: {counts['rows']} rows, {counts['drivers']} drivers, {counts['rendered']} files rendered")
+        if payments is not None:
+            print(f"  {counts['unmatched_trips']} trips without a payment, {counts['unmatched_payments']} payments without a trip")
+        for name, stage in report.to_dict()["stages"].items():
+            print(f"  {name:>16}: {stage['seconds']:8.3f}s  {stage['calls']:6d} calls  {stage['rows']:8d} rows  {stage['bytes'] / 2**20:8.2f} MiB")
+
+    if zip_sink:
+        with open(args.zip, "wb") as f:
+            f.write(zip_sink.getvalue())
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(reports, f, indent=2)
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Processed {len(inputs)} input(s) in {elapsed:.2f}s: "
+        f"{totals['rows'] / elapsed:.1f} rows/s, {totals['rendered'] / elapsed:.1f} files/s, "
+        f"{totals['bytes'] / elapsed / 2**20:.2f} MiB/s"
+    )
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""Driver identities behind the export's "Driver Name" strings.
+
+Team trips name both drivers in one cell, "Hamid Amani;Mohammad Yaqoob
+Shukuri", in either order. DriverIndex splits each distinct name string
+once, normalizes every member's name (Unicode form, whitespace and case)
+to an interned key, and regroups the trips so each person gets one
+workbook holding their solo and team trips alike.
+
+A team trip goes onto every member's sheet. TEAM_POLICIES says what its
+amounts become there: "share" keeps the full estimated cost and pay on each
+member's sheet, "split" divides them evenly between the members.
+"""
+import re
+import sys
+import unicodedata
+
+from aggregates import SUMMARY_FILENAME
+from ingest import PAY_FIELDS
+from manifest import MANIFEST_FILENAME
+from payments import UNMATCHED_REPORT_FILENAME
+
+TEAM_SEPARATOR = ";"
+TEAM_POLICIES = ("share", "split")
+
+# Amounts divided between the members of a team under the "split" policy.
+AMOUNT_FIELDS = ("estimated_cost",) + PAY_FIELDS
+
+_UNSAFE_FILENAME_RE = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+_RESERVED_FILENAMES = {"CON", "PRN", "AUX", "NUL", *(f"COM{n}" for n in range(1, 10)), *(f"LPT{n}" for n in range(1, 10))}
+
+# Files a run writes next to the driver workbooks; no driver may take them.
+RUN_FILENAMES = (SUMMARY_FILENAME, UNMATCHED_REPORT_FILENAME, MANIFEST_FILENAME)
+
+# Leaves room for " (2).xlsx" within the usual 255-byte filename limit.
+MAX_FILENAME_LENGTH = 120
+
+
+def normalize_name(name):
+    """Returns (key, display) for one person's name.
+
+    display is the name with surrounding and repeated whitespace removed;
+    key is its casefolded NFKC form, interned, so "zamen  Tamadon" and
+    "Zamen Tamadon" are the same person.
+    """
+    display = " ".join(unicodedata.normalize("NFKC", str(name)).split())
+    return sys.intern(display.casefold()), display
+
+
+def safe_filename(name):
+    """Turns a driver name into a filename stem valid on Windows and POSIX."""
+    stem = _UNSAFE_FILENAME_RE.sub("_", name).strip(" .")[:MAX_FILENAME_LENGTH].rstrip(" .")
+    if not stem:
+        return "_"
+    if stem.split(".")[0].upper() in _RESERVED_FILENAMES:
+        return f"_{stem}"
+    return stem
+
+
+def output_filenames(driver_names):
+    """Maps each driver name to a distinct, filesystem-safe .xlsx filename.
+
+    Names that only differ in characters a filename cannot hold get " (2)",
+    " (3)" and so on, in the order given; so does a name that would take one
+    of RUN_FILENAMES, like a driver called "_summary".
+    """
+    filenames = {}
+    taken = {filename.casefold() for filename in RUN_FILENAMES}
+    for driver_name in driver_names:
+        stem = safe_filename(driver_name)
+        filename, number = f"{stem}.xlsx", 1
+        while filename.casefold() in taken:
+            number += 1
+            filename = f"{stem} ({number}).xlsx"
+        taken.add(filename.casefold())
+        filenames[driver_name] = filename
+    return filenames
+
+
+def _split_amount(value, members):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return round(value / members, 2)
+    return value
+
+
+class DriverIndex:
+    """Maps "Driver Name" strings to the people they name.
+
+    Each distinct string is split and normalized the first time it is seen
+    and remembered, so a run does the work once per string rather than once
+    per row. A person's display name is the spelling first seen.
+
+    Args:
+        policy: "share" or "split", see TEAM_POLICIES.
+    """
+
+    def __init__(self, policy="share"):
+        if policy not in TEAM_POLICIES:
+            raise ValueError(f"Unknown team policy {policy!r}; expected one of {', '.join(TEAM_POLICIES)}")
+        self.policy = policy
+        # name string -> tuple of person keys, in the order named.
+        self._members = {}
+        # person key -> display name.
+        self.names = {}
+
+    def members(self, driver_name):
+        """Returns the keys of the people named by one "Driver Name" string."""
+        members = self._members.get(driver_name)
+        if members is None:
+            members = []
+            for part in str(driver_name or "").split(TEAM_SEPARATOR):
+                key, display = normalize_name(part)
+                if key and key not in members:
+                    members.append(key)
+                    self.names.setdefault(key, display)
+            members = self._members[driver_name] = tuple(members)
+        return members
+
+    def regroup(self, trips_by_name):
+        """Regroups trips by person.
+
+        Args:
+            trips_by_name: Dict of "Driver Name" string to trips, as
+                returned by engine.group_trips.
+
+        Returns:
+            (trips_by_driver, unassigned): trips_by_driver maps each
+            person's display name to their trips in input order, people in
+            the order first seen; unassigned lists the trips that name
+            nobody.
+        """
+        trips_by_person = {}
+        merged = set()
+        unassigned = []
+        for driver_name, trips in trips_by_name.items():
+            members = self.members(driver_name)
+            if not members:
+                unassigned.extend(trips)
+                continue
+            if len(members) > 1 and self.policy == "split":
+                trips = [
+                    trip._replace(**{field: _split_amount(getattr(trip, field), len(members)) for field in AMOUNT_FIELDS})
+                    for trip in trips
+                ]
+            for key in members:
+                person_trips = trips_by_person.get(key)
+                if person_trips is None:
+                    trips_by_person[key] = list(trips)
+                else:
+                    person_trips.extend(trips)
+                    merged.add(key)
+
+        # Trips gathered from several name strings go back into input order.
+        for key in merged:
+            trips_by_person[key].sort(key=lambda trip: trip.row_number)
+        return {self.names[key]: trips for key, trips in trips_by_person.items()}, unassigned
+
@@ -0,0 +1,497 @@
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+import pytz
+
+from aggregates import SUMMARY_FILENAME, aggregate, summary_workbook
+from drivers import DriverIndex, output_filenames
+from fast_writer import Unsupported, compile_skeleton
+from ingest import MissingColumns, load_trips
+from instrument import RunReport, rate_limited_warnings
+from layout import compile_layout, load_spec, next_free_rows, page_count
+from manifest import Manifest, driver_fingerprint
+from payments import UNMATCHED_REPORT_FILENAME, PaymentIndex, index_payments, join_payments, unmatched_report
+from preflight import READ_ERRORS, PreflightError, PreflightReport, check_trips, describe, rejected
+from sinks import DirectorySink
+from template_cache import default_cache
+
+# Render workers are started from a fresh server process rather than forked
+# from the caller: jobs start pools from a background thread of a threaded
+# server, and a fork there can copy a lock another thread holds into the
+# child. Where there is no forkserver (Windows), spawn.
+_POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# Pay weeks follow Mountain Time unless the run says otherwise.
+DEFAULT_TIMEZONE = 'MST'
+
+def group_trips(trips):
+    """Groups trip records by their Driver Name string in a single pass.
+
+    Team strings such as "A;B" are kept as they are; drivers.DriverIndex
+    turns the groups into one per person.
+
+    Args:
+        trips: Iterable of ingest.Trip records, in input order.
+
+    Returns:
+        A dict mapping each Driver Name string to the list of its trips,
+        in input order. Strings appear in the order they are first seen.
+    """
+    trips_by_driver = {}
+    for trip in trips:
+        trips_by_driver.setdefault(trip.driver_name, []).append(trip)
+    return trips_by_driver
+
+
+def pay_period(reference=None, timezone=DEFAULT_TIMEZONE):
+    """Returns the (today, start_date, end_date) pay week containing a date.
+
+    The week starts on the most recent Sunday (the date itself, if it is a
+    Sunday).
+
+    Args:
+        reference: date, datetime or "YYYY-MM-DD" string the week contains,
+            written as today; None for the current date in timezone.
+        timezone: pytz time zone name the current date, or an aware
+            datetime reference, is taken in.
+
+    Raises:
+        ValueError: If timezone is unknown or reference is not a date.
+    """
+    try:
+        zone = pytz.timezone(timezone)
+    except pytz.UnknownTimeZoneError:
+        raise ValueError(f"Unknown time zone: {timezone}") from None
+    if reference is None:
+        today = datetime.now(zone)
+    elif isinstance(reference, str):
+        today = date.fromisoformat(reference)
+    elif isinstance(reference, datetime) and reference.tzinfo is not None:
+        today = reference.astimezone(zone)
+    else:
+        today = reference
+    if today.weekday() == 6:
+        start_date = today
+    else:
+        start_date = today - timedelta(days=today.weekday() + 1)
+    end_date = start_date + timedelta(days=6)
+    return today, start_date, end_date
+
+
+def period_fields(period):
+    """Formats (today, start_date, end_date) the way they are written to D3/D6/D7."""
+    return tuple(day.strftime('%m/%d/%Y') for day in period)
+
+
+def header_context(driver_name, period, totals=None):
+    """Values for the layout's header fields.
+
+    totals is the driver's aggregates.Aggregates.totals(); without it the
+    total fields are left out.
+    """
+    today, start_date, end_date = period_fields(period)
+    return {'driver_name': driver_name, 'today': today, 'start_date': start_date, 'end_date': end_date, **(totals or {})}
+
+
+def render_driver(template, driver_name, trips, period, plan, report=None, totals=None):
+    """Lays out all of a driver's trips on a fresh copy of the template.
+
+    Trips beyond the plan's capacity continue on copies of the template
+    sheet, named "<sheet> (2)", "<sheet> (3)" and so on.
+
+    Args:
+        template: ParsedTemplate to clone the workbook from.
+        driver_name: Value written to the driver field.
+        trips: List of the driver's ingest.Trip records.
+        period: (today, start_date, end_date) as returned by pay_period.
+        plan: layout.WritePlan to place the values with.
+        report: Optional instrument.RunReport to time the "template clone"
+            and "cell writes" stages in.
+        totals: The driver's totals for the header, see header_context.
+
+    Returns:
+        The populated, unsaved workbook.
+    """
+    report = report if report is not None else RunReport()
+    with report.stage("template clone"):
+        workbook = template.clone()
+        base = workbook[plan.sheet] if plan.sheet else workbook.active
+        sheets = [base]
+        for page in range(2, page_count(plan, len(trips)) + 1):
+            sheet = workbook.copy_worksheet(base)
+            sheet.title = f"{base.title[:25]} ({page})"
+            sheets.append(sheet)
+
+    with report.stage("cell writes", rows=len(trips)):
+        context = header_context(driver_name, period, totals)
+        for sheet in sheets:
+            for row, column, field in plan.header:
+                sheet.cell(row=row, column=column).value = context[field]
+
+        capacity = plan.capacity
+        for index, trip in enumerate(trips):
+            sheet = sheets[index // capacity]
+            for row, column, field in plan.blocks[index % capacity]:
+                sheet.cell(row=row, column=column).value = getattr(trip, field)
+
+    return workbook
+
+
+def render_file(template, driver_name, trips, period, plan, skeleton=None, report=None, totals=None):
+    """Renders one driver's workbook and serializes it to xlsx bytes.
+
+    With a fast_writer.Skeleton the file is patched straight from the
+    skeleton; drivers or values it cannot handle fall back to openpyxl.
+    Stage timings go to report, an optional instrument.RunReport; totals
+    are the driver's header totals, see header_context.
+
+    Returns:
+        (entry, data): entry is the driver's processed_drivers entry, as
+        returned by layout.next_free_rows; data is the xlsx file content. If the workbook could
+        not be rendered, entry is {'error': message} and data is None.
+    """
+    report = report if report is not None else RunReport()
+    try:
+        if skeleton is not None:
+            try:
+                with report.stage("fast write", rows=len(trips)) as counts:
+                    data = skeleton.render(header_context(driver_name, period, totals), trips)
+                    counts["bytes"] = len(data)
+                return next_free_rows(plan, len(trips)), data
+            except Unsupported:
+                pass
+        workbook = render_driver(template, driver_name, trips, period, plan, report, totals)
+        with report.stage("save") as counts:
+            buffer = io.BytesIO()
+            workbook.save(buffer)
+            counts["bytes"] = buffer.tell()
+    except Exception as exc:
+        logging.exception("Failed to render payroll file for driver %r", driver_name)
+        return {'error': f"{type(exc).__name__}: {exc}"}, None
+    return next_free_rows(plan, len(trips)), buffer.getvalue()
+
+
+# Per-process render state, set once by _init_worker so the template is shipped
+# to each worker a single time rather than with every task.
+_worker = {}
+
+
+def _init_worker(template, period, plan, skeleton):
+    _worker.update(template=template, period=period, plan=plan, skeleton=skeleton)
+
+
+def _render_file_in_worker(driver_name, trips, totals):
+    report = RunReport()
+    result = render_file(_worker['template'], driver_name, trips, _worker['period'], _worker['plan'], _worker['skeleton'], report, totals)
+    return result, report.stages
+
+
+def render_files_parallel(template, trips_by_driver, period, plan, workers=None, chunksize=None, skeleton=None, report=None, totals=None):
+    """Renders every driver's workbook across a process pool.
+
+    Args:
+        template: ParsedTemplate, sent to each worker once at start-up.
+        trips_by_driver: Dict as returned by group_trips.
+        period: (today, start_date, end_date) as returned by pay_period.
+        plan: layout.WritePlan, sent to each worker once with the template.
+        workers: Number of worker processes; defaults to os.cpu_count().
+        chunksize: Drivers sent to a worker per task; defaults to spreading
+            the drivers over roughly four tasks per worker.
+        skeleton: Optional fast_writer.Skeleton, sent once like the template.
+        report: Optional instrument.RunReport the workers' stage timings
+            are merged into.
+        totals: Optional dict of driver name to the driver's header
+            totals, see header_context.
+
+    Yields:
+        (driver_name, (entry, data)) pairs as returned by render_file, in the
+        order of trips_by_driver, as soon as each one is available.
+    """
+    workers = workers or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(trips_by_driver) // (workers * 4))
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context(_POOL_START_METHOD),
+        initializer=_init_worker,
+        initargs=(template, period, plan, skeleton),
+    )
+    try:
+        driver_totals = [(totals or {}).get(driver_name) for driver_name in trips_by_driver]
+        results = executor.map(_render_file_in_worker, trips_by_driver.keys(), trips_by_driver.values(), driver_totals, chunksize=chunksize)
+        for driver_name, (result, stages) in zip(trips_by_driver.keys(), results):
+            if report is not None:
+                report.merge(stages)
+            yield driver_name, result
+    finally:
+        # If the caller stops early (e.g. a cancelled job), drop the drivers not yet started.
+        executor.shutdown(cancel_futures=True)
+
+
+def process_excel(input_file, template_file, output_dir=None, template_cache=default_cache, workers=1, chunksize=None, sinks=(), incremental=False, layout=None, report=None, fast=False, payments=None, input_cache=None, progress=None, team_policy="share", reference_date=None, timezone=DEFAULT_TIMEZONE, validate=False):
+    """Processes the trips export and writes one payroll workbook per driver.
+
+    The input is streamed read-only and every trip is grouped by driver
+    first, so each output workbook is cloned from the parsed template and
+    serialized exactly once, however many trips it holds. Each finished
+    workbook is handed straight to the sinks, followed by a summary of the
+    per-driver and per-facility totals, SUMMARY_FILENAME (see aggregates.py).
+
+    Args:
+        input_file: Path or binary file-like object of the input Excel file.
+        template_file: Path, bytes or binary file-like object of the template.
+        output_dir: Directory to save the workbooks in, or None to skip disk.
+        template_cache: TemplateCache the template is parsed into.
+        workers: Number of processes rendering workbooks. 1 renders in this
+            process; None uses one worker per CPU.
+        chunksize: Drivers sent to a worker per task when workers != 1.
+        sinks: Extra sinks.ZipSink/DirectorySink objects receiving every
+            workbook. The caller closes them.
+        incremental: Only re-render drivers whose trips, template or pay
+            period changed since the last run into output_dir, and delete
+            the files of drivers no longer in the input. Unchanged files are
+            read back from output_dir for the other sinks.
+        layout: Layout spec dict or JSON path; None looks for a sidecar
+            next to the template, then defined names in it (see layout.py).
+        report: Optional instrument.RunReport, filled with the run's
+            per-stage timings, its 'rows', 'drivers', 'rendered', 'reused',
+            'errors' and 'bytes' counts and the warnings it logged. Repeated
+            warnings are rate-limited while the run logs them.
+        fast: Write files with the fast_writer skeleton when the template is
+            simple enough, instead of a full openpyxl load/save per driver.
+        payments: Optional payment export (path or binary file-like object)
+            or a payments.PaymentIndex built from one. Each trip's actual
+            pay is joined onto it for the layout's pay fields, and the
+            trips and payments that did not match are written to the sinks
+            as UNMATCHED_REPORT_FILENAME.
+        input_cache: Optional input_cache.InputCache. The parsed trips and
+            payment index are looked up by the content hash of the exports,
+            so processing the same upload again skips reading the xlsx.
+        progress: Optional callable, called as progress(done, total) once
+            the drivers are known and again after each driver's workbook is
+            written or reused. An exception it raises stops the run.
+        team_policy: How team trips ("A;B" in Driver Name) are paid on each
+            member's workbook: "share" gives each the full amounts, "split"
+            divides them evenly (see drivers.py). Every person gets a
+            single workbook either way; trips naming nobody are skipped.
+        reference_date: date, datetime or "YYYY-MM-DD" in the pay week to
+            write; None for the current week. The week is worked out once
+            per run (see pay_period).
+        timezone: pytz time zone name "today" is taken in.
+        validate: Check the parsed trips with preflight.check_trips before
+            anything is rendered. Errors, including a missing header or an
+            unreadable file, raise preflight.PreflightError (a ValueError
+            carrying the PreflightReport); warnings are logged.
+
+    Returns:
+        A dict mapping each driver name to its next free block rows and
+        sheet count (see layout.next_free_rows), or to {'error': message}
+        for drivers whose workbook could not be written.
+    """
+    if incremental and not output_dir:
+        raise ValueError("Incremental runs need an output_dir to keep their manifest in")
+
+    driver_index = DriverIndex(team_policy)
+    period = pay_period(reference_date, timezone)
+    report = report if report is not None else RunReport()
+    with rate_limited_warnings(report):
+        processed_drivers = _process(
+            input_file, template_file, output_dir,
+            template_cache=template_cache,
+            workers=workers,
+            chunksize=chunksize,
+            sinks=sinks,
+            incremental=incremental,
+            layout=layout,
+            report=report,
+            fast=fast,
+            payments=payments,
+            input_cache=input_cache,
+            progress=progress,
+            driver_index=driver_index,
+            period=period,
+            validate=validate,
+        )
+    report.finish()
+    return processed_drivers
+
+
+def _input_size(input_file):
+    if isinstance(input_file, (str, os.PathLike)):
+        return os.path.getsize(input_file)
+    try:
+        position = input_file.tell()
+        size = input_file.seek(0, os.SEEK_END)
+        input_file.seek(position)
+        return size
+    except (AttributeError, OSError):
+        return 0
+
+
+def _add_to_sinks(sinks, filename, data, report):
+    for sink in sinks:
+        with report.stage(sink.stage, bytes=len(data)):
+            sink.add(filename, data)
+
+
+def _cached(input_cache, source, parse, kind):
+    if input_cache is None:
+        return parse(source)
+    return input_cache.get(source, parse, kind)
+
+
+def _process(input_file, template_file, output_dir, *, template_cache, workers, chunksize, sinks, incremental, layout, report, fast, payments, input_cache, progress, driver_index, period, validate):
+    # Keyword-only, so adding a run option cannot silently shift the others.
+    template = template_cache.get(template_file)
+    template_workbook = template.clone()
+    plan = compile_layout(load_spec(layout, template_file, template_workbook), template_workbook)
+
+    with report.stage("input load", bytes=_input_size(input_file)) as counts:
+        try:
+            header_row, columns, trips = _cached(input_cache, input_file, lambda source: load_trips(source, report=report), "trips")
+        except (MissingColumns,) + READ_ERRORS as exc:
+            if not validate:
+                raise
+            checked = rejected(exc)
+            report.preflight = checked.to_dict()
+            raise PreflightError(checked) from exc
+        counts["rows"] = len(trips)
+    row_count = len(trips)
+    if validate:
+        with report.stage("preflight", rows=row_count):
+            checked = PreflightReport()
+            checked.header_row, checked.columns = header_row, columns
+            check_trips(trips, checked, plan, driver_index)
+        report.preflight = checked.to_dict()
+        if not checked.ok:
+            raise PreflightError(checked)
+        for issue in checked.warnings:
+            logging.warning("Preflight: %s", describe(issue))
+    with report.stage("grouping", rows=row_count):
+        trips_by_driver = group_trips(trips)
+    del trips
+
+    unmatched = None
+    if payments is not None:
+        with report.stage("payments index") as counts:
+            index = payments if isinstance(payments, PaymentIndex) else _cached(input_cache, payments, index_payments, "payments")
+            counts["rows"] = len(index)
+        with report.stage("join", rows=row_count):
+            trips_by_driver, unmatched_trips, unmatched_payments = join_payments(trips_by_driver, index)
+        unmatched = (unmatched_trips, unmatched_payments)
+        report.counts["unmatched_trips"] += len(unmatched_trips)
+        report.counts["unmatched_payments"] += len(unmatched_payments)
+
+    # Payments are joined per export row first, so a team trip's pay is
+    # matched once before it is shared or split between the drivers.
+    with report.stage("driver index", rows=row_count):
+        trips_by_name = trips_by_driver
+        trips_by_driver, unassigned = driver_index.regroup(trips_by_name)
+    if unassigned:
+        rows = ", ".join(str(trip.row_number) for trip in unassigned[:10])
+        more = f" and {len(unassigned) - 10} more" if len(unassigned) > 10 else ""
+        logging.warning("%d trips have no Driver Name and were skipped (rows %s%s)", len(unassigned), rows, more)
+        report.counts["unassigned"] += len(unassigned)
+    filenames = output_filenames(trips_by_driver)
+
+    with report.stage("aggregate", rows=row_count):
+        export_trips = [trip for driver_name, trips in trips_by_name.items() if driver_index.members(driver_name) for trip in trips]
+        aggregates = aggregate(trips_by_driver, export_trips)
+        totals = {driver_name: aggregates.totals(driver_name) for driver_name in trips_by_driver}
+
+    skeleton = None
+    if fast:
+        try:
+            skeleton = compile_skeleton(template, plan)
+        except Unsupported as exc:
+            logging.warning("Fast writer disabled for this template: %s", exc)
+
+    processed_drivers = {}
+    to_render = trips_by_driver
+    if progress is not None:
+        progress(0, len(trips_by_driver))
+    if incremental:
+        manifest = Manifest(output_dir)
+        fingerprints = {
+            driver_name: driver_fingerprint(driver_name, trips, template.key, period_fields(period), plan)
+            for driver_name, trips in trips_by_driver.items()
+        }
+        manifest.remove_stale(set(filenames.values()))
+        to_render = {}
+        for driver_name, trips in trips_by_driver.items():
+            filename = filenames[driver_name]
+            if manifest.is_current(filename, fingerprints[driver_name]):
+                if sinks:
+                    with report.stage("reuse", rows=len(trips)) as counts:
+                        with open(os.path.join(output_dir, filename), "rb") as f:
+                            data = f.read()
+                        counts["bytes"] = len(data)
+                    _add_to_sinks(sinks, filename, data, report)
+                processed_drivers[driver_name] = next_free_rows(plan, len(trips))
+                report.counts["reused"] += 1
+                if progress is not None:
+                    progress(len(processed_drivers), len(trips_by_driver))
+            else:
+                to_render[driver_name] = trips
+
+    sinks = list(sinks)
+    if output_dir:
+        sinks.append(DirectorySink(output_dir))
+
+    if workers != 1 and len(to_render) > 1:
+        rendered = render_files_parallel(template, to_render, period, plan, workers, chunksize, skeleton, report, totals)
+    else:
+        rendered = ((driver_name, render_file(template, driver_name, trips, period, plan, skeleton, report, totals[driver_name])) for driver_name, trips in to_render.items())
+
+    counts = report.counts
+    for driver_name, (entry, data) in rendered:
+        if data is not None:
+            counts["rendered"] += 1
+            counts["bytes"] += len(data)
+            try:
+                _add_to_sinks(sinks, filenames[driver_name], data, report)
+            except OSError as exc:
+                logging.exception("Failed to write payroll file for driver %r", driver_name)
+                entry = {'error': f"{type(exc).__name__}: {exc}"}
+        if 'error' in entry:
+            counts["errors"] += 1
+        processed_drivers[driver_name] = entry
+        if incremental:
+            if 'error' in entry:
+                manifest.forget(filenames[driver_name])
+            else:
+                manifest.record(filenames[driver_name], driver_name, fingerprints[driver_name])
+        if progress is not None:
+            progress(len(processed_drivers), len(trips_by_driver))
+
+    if incremental:
+        manifest.save()
+
+    with report.stage("save") as saved:
+        buffer = io.BytesIO()
+        summary_workbook(aggregates, period_fields(period)).save(buffer)
+        saved["bytes"] = buffer.tell()
+    _add_to_sinks(sinks, SUMMARY_FILENAME, buffer.getvalue(), report)
+
+    if unmatched is not None:
+        with report.stage("save") as saved:
+            buffer = io.BytesIO()
+            unmatched_report(*unmatched).save(buffer)
+            saved["bytes"] = buffer.tell()
+        _add_to_sinks(sinks, UNMATCHED_REPORT_FILENAME, buffer.getvalue(), report)
+    elif output_dir:
+        # Left by an earlier run with payments; this run's has nothing to report.
+        try:
+            os.remove(os.path.join(output_dir, UNMATCHED_REPORT_FILENAME))
+        except FileNotFoundError:
+            pass
+
+    counts["rows"] += row_count
+    counts["drivers"] += len(trips_by_driver)
+
+    return {driver_name: processed_drivers[driver_name] for driver_name in trips_by_driver}
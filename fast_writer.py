@@ -0,0 +1,168 @@
+"""Template-free fast writer for simple payroll templates.
+
+compile_skeleton() saves the parsed template once through openpyxl and keeps
+the resulting xlsx parts as a static skeleton, with the filled sheet's XML
+pre-split into rows. Rendering a driver then patches only the cells the
+WritePlan touches and zips the parts back up, skipping openpyxl's clone,
+cell graph and serializer entirely.
+
+Cells are emitted the way openpyxl writes them (inline strings, the
+template cell's style), so reading a fast-path file back gives the same cell
+contents as the normal openpyxl path. Templates with parts the skeleton
+cannot reproduce, drivers that need overflow sheets and values other than
+text, numbers and booleans raise Unsupported so the caller can fall back.
+"""
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.compat.strings import safe_string
+from openpyxl.utils.cell import get_column_letter, range_boundaries
+
+# Package parts that would need more than cell patching to stay consistent.
+UNSUPPORTED_PARTS = ("vbaProject", "drawings/", "comments", "tables/", "pivot", "charts/", "externalLinks/", "calcChain")
+
+_ROW_RE = re.compile(r'<row r="(\d+)"[^>]*?(?:/>|>.*?</row>)', re.S)
+_CELL_RE = re.compile(r'<c r="([A-Z]+)(\d+)"[^>]*?(?:/>|>.*?</c>)', re.S)
+_STYLE_RE = re.compile(r' s="(\d+)"')
+_DIMENSION_RE = re.compile(r'<dimension ref="([^"]+)" />')
+
+
+class Unsupported(Exception):
+    """The template or a value cannot be written by the fast writer."""
+
+
+def _cell_xml(coordinate, style, value):
+    style_attr = f' s="{style}"' if style else ''
+    if value is None:
+        return f'<c r="{coordinate}"{style_attr} t="n" />' if style else None
+    if isinstance(value, bool):
+        return f'<c r="{coordinate}"{style_attr} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{coordinate}"{style_attr} t="n"><v>{safe_string(value)}</v></c>'
+    if isinstance(value, str):
+        if ILLEGAL_CHARACTERS_RE.search(value):
+            raise Unsupported(f"Illegal characters in {coordinate}")
+        if value.startswith("=") and len(value) > 1:
+            return f'<c r="{coordinate}"{style_attr}><f>{escape(value[1:])}</f><v /></c>'
+        if not value:
+            return f'<c r="{coordinate}"{style_attr} t="inlineStr" />'
+        space = ' xml:space="preserve"' if value != value.strip() else ''
+        return f'<c r="{coordinate}"{style_attr} t="inlineStr"><is><t{space}>{escape(value)}</t></is></c>'
+    raise Unsupported(f"Cannot write {type(value).__name__} value to {coordinate}")
+
+
+class Skeleton:
+    """The static parts of a saved template plus its pre-split target sheet."""
+
+    def __init__(self, parts, sheet_part, sheet_xml, plan):
+        self.parts = parts
+        self.sheet_part = sheet_part
+        self.plan = plan
+
+        start = sheet_xml.index("<sheetData>") + len("<sheetData>")
+        end = sheet_xml.index("</sheetData>")
+        self.prefix = sheet_xml[:start]
+        self.suffix = sheet_xml[end:]
+        self.dimension = _DIMENSION_RE.search(self.prefix).group(1)
+
+        # row number -> (opening tag, {column index: cell xml})
+        self.rows = {}
+        for match in _ROW_RE.finditer(sheet_xml, start, end):
+            row_xml = match.group(0)
+            if row_xml.endswith("/>") and "<c " not in row_xml:
+                open_tag, cells = row_xml[:-2].rstrip() + ">", {}
+            else:
+                open_tag = row_xml[:row_xml.index(">") + 1]
+                cells = {}
+                for cell in _CELL_RE.finditer(row_xml):
+                    cells[range_boundaries(cell.group(1) + cell.group(2))[0]] = cell.group(0)
+            self.rows[int(match.group(1))] = (open_tag, cells)
+        self.row_xml = {row: open_tag + "".join(cells[col] for col in sorted(cells)) + "</row>" for row, (open_tag, cells) in self.rows.items()}
+
+    def sheet_xml(self, writes):
+        """Returns the sheet XML with {(row, column): value} writes applied."""
+        touched = {}
+        for (row, column), value in writes.items():
+            touched.setdefault(row, {})[column] = value
+
+        row_xml = dict(self.row_xml)
+        for row, values in touched.items():
+            open_tag, cells = self.rows.get(row, (f'<row r="{row}">', {}))
+            cells = dict(cells)
+            for column, value in values.items():
+                coordinate = f"{get_column_letter(column)}{row}"
+                existing = cells.get(column)
+                style_match = _STYLE_RE.search(existing) if existing else None
+                xml = _cell_xml(coordinate, style_match.group(1) if style_match else None, value)
+                if xml is None:
+                    cells.pop(column, None)
+                else:
+                    cells[column] = xml
+            row_xml[row] = open_tag + "".join(cells[col] for col in sorted(cells)) + "</row>"
+
+        min_col, min_row, max_col, max_row = range_boundaries(self.dimension)
+        prefix = self.prefix
+        if touched:
+            new_max_row = max(max_row, max(touched))
+            new_max_col = max(max_col, max(max(values) for values in touched.values()))
+            if (new_max_row, new_max_col) != (max_row, max_col):
+                dimension = f"{get_column_letter(min_col)}{min_row}:{get_column_letter(new_max_col)}{new_max_row}"
+                prefix = prefix.replace(f'<dimension ref="{self.dimension}" />', f'<dimension ref="{dimension}" />')
+
+        return prefix + "".join(row_xml[row] for row in sorted(row_xml)) + self.suffix
+
+    def render(self, context, trips):
+        """Renders one driver's xlsx file.
+
+        Args:
+            context: Header field values, keyed like layout.HEADER_FIELDS.
+            trips: The driver's trips; at most plan.capacity of them.
+
+        Returns:
+            The xlsx file content.
+        """
+        plan = self.plan
+        if len(trips) > plan.capacity:
+            raise Unsupported("Driver needs overflow sheets")
+
+        writes = {}
+        for row, column, field in plan.header:
+            writes[(row, column)] = context[field]
+        for trip, block in zip(trips, plan.blocks):
+            for row, column, field in block:
+                writes[(row, column)] = getattr(trip, field)
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, data in self.parts:
+                if name == self.sheet_part:
+                    data = self.sheet_xml(writes).encode("utf-8")
+                archive.writestr(name, data)
+        return buffer.getvalue()
+
+
+def compile_skeleton(template, plan):
+    """Compiles a ParsedTemplate and WritePlan into a Skeleton.
+
+    Raises:
+        Unsupported: If the template has parts the fast writer cannot keep
+            consistent, such as macros, drawings, comments or tables.
+    """
+    workbook = template.clone()
+    sheet = workbook[plan.sheet] if plan.sheet else workbook.active
+    sheet_part = f"xl/worksheets/sheet{workbook.index(sheet) + 1}.xml"
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    with zipfile.ZipFile(buffer) as archive:
+        parts = [(info.filename, archive.read(info.filename)) for info in archive.infolist()]
+
+    for name, _ in parts:
+        if any(marker in name for marker in UNSUPPORTED_PARTS):
+            raise Unsupported(f"Template part {name} is not supported")
+
+    sheet_xml = dict(parts)[sheet_part].decode("utf-8")
+    return Skeleton(parts, sheet_part, sheet_xml, plan)
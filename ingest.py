@@ -0,0 +1,203 @@
+import re
+
+from xlsx_reader import open_rows
+
+TARGET_COLUMNS = ("Trip ID", "Driver Name", "Facility Sequence", "Estimated Cost")
+
+# Read when present; the payments join matches trips on them.
+OPTIONAL_COLUMNS = ("Load ID", "Block ID")
+
+# Other header spellings accepted for a column. Headers are compared
+# case-insensitively with runs of spaces and underscores collapsed, so
+# "TRIP_ID" and "trip  id" already match "Trip ID" without an alias.
+COLUMN_ALIASES = {
+    "Driver Name": ("Driver", "Driver Names"),
+    "Facility Sequence": ("Facilities",),
+    "Estimated Cost": ("Est Cost", "Estimated Amount"),
+    "Load ID": ("Load",),
+}
+
+# How far down the sheet to look for the header row before giving up.
+MAX_HEADER_ROWS = 50
+
+class MissingColumns(ValueError):
+    """The header row with every required column was not found."""
+
+
+PAY_FIELDS = ("base_rate", "fuel_surcharge", "tolls", "detention", "tonu", "others", "gross_pay")
+
+
+class Trip:
+    """One data row of a trips export.
+
+    A plain __slots__ record rather than the export's whole row: only the
+    projected columns are kept, without a per-instance dict. The pay fields
+    hold the carrier's actual pay for the trip once payments.join_payments
+    has matched it; they are None until then.
+    """
+
+    __slots__ = ("trip_id", "driver_name", "facility_sequence", "estimated_cost", "row_number", "load_id", "block_id") + PAY_FIELDS
+
+    def __init__(
+        self, trip_id, driver_name, facility_sequence, estimated_cost, row_number, load_id=None, block_id=None,
+        base_rate=None, fuel_surcharge=None, tolls=None, detention=None, tonu=None, others=None, gross_pay=None,
+    ):
+        self.trip_id = trip_id
+        self.driver_name = driver_name
+        self.facility_sequence = facility_sequence
+        self.estimated_cost = estimated_cost
+        self.row_number = row_number
+        self.load_id = load_id
+        self.block_id = block_id
+        self.base_rate = base_rate
+        self.fuel_surcharge = fuel_surcharge
+        self.tolls = tolls
+        self.detention = detention
+        self.tonu = tonu
+        self.others = others
+        self.gross_pay = gross_pay
+
+    def _replace(self, **fields):
+        values = {slot: getattr(self, slot) for slot in self.__slots__}
+        values.update(fields)
+        return Trip(**values)
+
+    def __iter__(self):
+        return (getattr(self, slot) for slot in self.__slots__)
+
+    def __eq__(self, other):
+        return isinstance(other, Trip) and tuple(self) == tuple(other)
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return f"Trip({', '.join(f'{slot}={getattr(self, slot)!r}' for slot in self.__slots__)})"
+
+    def __getstate__(self):
+        return tuple(self)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+
+def normalize_header(value):
+    """Folds a header cell for comparison: case, spaces and underscores."""
+    return re.sub(r"[\s_]+", " ", str(value)).strip().casefold()
+
+
+def header_names(columns, aliases=COLUMN_ALIASES):
+    """Maps the normalized spelling of each column and its aliases to the column."""
+    names = {}
+    for column in columns:
+        for name in (column,) + tuple(aliases.get(column, ())):
+            names.setdefault(normalize_header(name), column)
+    return names
+
+
+def match_header(row, columns=TARGET_COLUMNS, aliases=COLUMN_ALIASES):
+    """Maps each of columns found in a row, under its own name or an alias,
+    to its 0-based index."""
+    names = header_names(columns, aliases)
+    found = {}
+    for col_idx, value in enumerate(row):
+        if value is not None:
+            name = names.get(normalize_header(value))
+            if name is not None and name not in found:
+                found[name] = col_idx
+    return found
+
+
+def find_header(rows, max_header_rows=MAX_HEADER_ROWS, columns=TARGET_COLUMNS, optional=(), aliases=COLUMN_ALIASES):
+    """Consumes rows up to and including the header row.
+
+    Args:
+        rows: Iterator of row value tuples, starting at row 1.
+        max_header_rows: Number of rows to scan before giving up.
+        columns: Column names the header row must hold.
+        optional: Column names picked up from the header row if present.
+        aliases: Other accepted spellings of the column names.
+
+    Returns:
+        (header_row_number, found) where found maps each name in columns,
+        and each name in optional that the header holds, to its 0-based
+        index. The iterator is left positioned on the first data row.
+
+    Raises:
+        MissingColumns: If no row within max_header_rows holds every one of
+            columns.
+    """
+    best = {}
+    for row_number, row in enumerate(rows, 1):
+        found = match_header(row, columns + tuple(optional), aliases)
+        if all(name in found for name in columns):
+            return row_number, found
+        if len(found) > len(best):
+            best = found
+        if row_number >= max_header_rows:
+            break
+
+    missing = [name for name in columns if name not in best]
+    raise MissingColumns(f"Missing target columns in input file: {', '.join(missing)}")
+
+
+def iter_trips(input_file, max_header_rows=MAX_HEADER_ROWS, report=None):
+    """Streams typed trip records from a trips export.
+
+    Rows are parsed lazily from the sheet XML, so memory stays flat however
+    many rows the export has. Scanning for the header stops at the first row
+    holding every target column; below it only the target and optional
+    columns are decoded.
+
+    Args:
+        input_file: Path or binary file-like object of the input Excel file.
+        max_header_rows: Number of rows to scan for the header.
+        report: Optional instrument.RunReport; the header scan is recorded
+            as its "header detection" stage.
+
+    Yields:
+        A Trip for every data row below the header.
+    """
+    with open_rows(input_file) as rows:
+        header_row, columns = _find_trips_header(rows, max_header_rows, report)
+        yield from trips_from_rows(rows, header_row, columns)
+
+
+def load_trips(input_file, max_header_rows=MAX_HEADER_ROWS, report=None):
+    """Reads a whole trips export, keeping where its header was found.
+
+    Args are as for iter_trips.
+
+    Returns:
+        (header_row, columns, trips): the 1-based header row, the column
+        name to 0-based index mapping find_header returned, and the list of
+        Trip records.
+    """
+    with open_rows(input_file) as rows:
+        header_row, columns = _find_trips_header(rows, max_header_rows, report)
+        return header_row, columns, list(trips_from_rows(rows, header_row, columns))
+
+
+def _find_trips_header(rows, max_header_rows, report):
+    if report is None:
+        return find_header(rows, max_header_rows, optional=OPTIONAL_COLUMNS)
+    with report.stage("header detection") as counts:
+        header_row, columns = find_header(rows, max_header_rows, optional=OPTIONAL_COLUMNS)
+        counts["rows"] = header_row
+    return header_row, columns
+
+
+def trips_from_rows(rows, header_row, columns):
+    """Yields a Trip for every non-empty row below the header.
+
+    Args:
+        rows: xlsx_reader rows positioned just below the header row.
+        header_row: 1-based number of the header row.
+        columns: Column name to index mapping, as returned by find_header.
+    """
+    rows.columns = tuple(columns.get(name) for name in TARGET_COLUMNS + OPTIONAL_COLUMNS)
+    for row_number, row in enumerate(rows, header_row + 1):
+        if row:
+            trip_id, driver_name, facility_sequence, estimated_cost, load_id, block_id = row
+            yield Trip(trip_id, driver_name, facility_sequence, estimated_cost, row_number, load_id, block_id)
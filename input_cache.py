@@ -0,0 +1,165 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+# Bump when the parsed form of an export changes, so stale on-disk entries are ignored.
+CACHE_VERSION = 2
+
+# Inputs are hashed this many bytes at a time.
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def content_hash(source):
+    """SHA-256 of a path, bytes object or binary file-like object's content.
+
+    File-like objects are read in chunks and left at their original
+    position, so the same object can be parsed afterwards.
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray)):
+        digest.update(source)
+        return digest.hexdigest()
+    if hasattr(source, "read"):
+        position = source.tell()
+        source.seek(0)
+        for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        source.seek(position)
+        return digest.hexdigest()
+    with open(source, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class InputCache:
+    """Parsed exports keyed on the SHA-256 of the uploaded file's content.
+
+    Re-processing the same trips or payment export (say with another
+    template or output option) reuses the parsed records instead of reading
+    the xlsx again. Entries live in an in-memory LRU and, if directory is
+    given, in a pickle store on disk that outlives the process.
+
+    Args:
+        max_bytes: Total pickled size of the entries kept in memory before
+            the least recently used ones are dropped.
+        directory: Optional directory for the on-disk store.
+        max_disk_bytes: Total size of the on-disk store before the oldest
+            files are deleted.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, directory=None, max_disk_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+        # Guards the LRU and its byte count; the hashing and parsing of a
+        # miss run outside it, so concurrent jobs only wait on bookkeeping.
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, source, parse, kind):
+        """Returns the parsed form of source, parsing it on a miss.
+
+        Args:
+            source: Path, bytes or binary file-like object of the export.
+            parse: Called with source on a miss; returns the parsed value.
+                The value is shared between callers and must not be mutated.
+            kind: Name of the parser, e.g. "trips", so one file parsed two
+                ways gets two entries.
+        """
+        key = f"{kind}-v{CACHE_VERSION}-{content_hash(source)}"
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        snapshot = self._read_disk(key)
+        from_disk = snapshot is not None
+        if from_disk:
+            value = pickle.loads(snapshot)
+        else:
+            value = parse(source)
+            snapshot = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            self._write_disk(key, snapshot)
+        with self._lock:
+            if from_disk:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+            self._remember(key, value, len(snapshot))
+        return value
+
+    def _remember(self, key, value, size):
+        # Another job may have parsed the same export meanwhile.
+        if size > self.max_bytes or key in self._entries:
+            return
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, dropped) = self._entries.popitem(last=False)
+            self._bytes -= dropped
+            self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pickle")
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                snapshot = f.read()
+        except OSError:
+            return None
+        os.utime(self._path(key))
+        return snapshot
+
+    def _write_disk(self, key, snapshot):
+        if not self.directory or len(snapshot) > self.max_disk_bytes:
+            return
+        temp_path = self._path(key) + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(snapshot)
+        os.replace(temp_path, self._path(key))
+
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pickle"):
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def stats(self):
+        """Hit, miss and size counters."""
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+    def clear(self):
+        """Empties the in-memory LRU; the on-disk store is left alone."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+# Keyed by the upload's content hash, so an export uploaded again under another
+# name, or by another session, is parsed once per process.
+default_cache = InputCache()
@@ -0,0 +1,161 @@
+"""Run instrumentation: per-stage timings, optional profilers and rate-limited warnings."""
+import cProfile
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Stage names in pipeline order, so reports list them the way a run flows.
+STAGES = (
+    "input load", "header detection", "preflight", "grouping", "payments index", "join", "driver index", "aggregate", "template clone", "cell writes",
+    "fast write", "save", "reuse", "zip", "disk write",
+)
+
+
+class RunReport:
+    """Wall time, call, row and byte counts for each stage of a run.
+
+    Stages are accumulated, so a stage entered once per driver reports the
+    total across drivers. Reports from worker processes are merged in with
+    merge(). "header detection" runs inside "input load" and is counted in
+    both; the other stages do not overlap. Stages run in worker processes
+    add up the time spent in every worker, so can exceed the run's elapsed.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counts = {
+            "rows": 0, "drivers": 0, "rendered": 0, "reused": 0, "errors": 0, "bytes": 0,
+            "unmatched_trips": 0, "unmatched_payments": 0, "unassigned": 0,
+        }
+        self.warnings = {}
+        self.profile = None
+        self.memory = None
+        # preflight.PreflightReport.to_dict() of a validated run.
+        self.preflight = None
+        self.started = time.perf_counter()
+        self.elapsed = None
+
+    def add(self, name, seconds=0.0, calls=1, rows=0, bytes=0):
+        stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "rows": 0, "bytes": 0})
+        stage["seconds"] += seconds
+        stage["calls"] += calls
+        stage["rows"] += rows
+        stage["bytes"] += bytes
+
+    @contextmanager
+    def stage(self, name, rows=0, bytes=0):
+        """Times the enclosed block as one call of stage name.
+
+        Yields a {"rows", "bytes"} dict the block can update with counts it
+        only knows once it has run.
+        """
+        counts = {"rows": rows, "bytes": bytes}
+        start = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            self.add(name, time.perf_counter() - start, rows=counts["rows"], bytes=counts["bytes"])
+
+    def seconds(self, name):
+        return self.stages.get(name, {}).get("seconds", 0.0)
+
+    def merge(self, stages):
+        """Adds another report's stages dict into this one."""
+        for name, stage in stages.items():
+            self.add(name, stage["seconds"], stage["calls"], stage["rows"], stage["bytes"])
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def to_dict(self):
+        order = {name: index for index, name in enumerate(STAGES)}
+        return {
+            "elapsed": self.elapsed,
+            "counts": dict(self.counts),
+            "stages": {name: self.stages[name] for name in sorted(self.stages, key=lambda name: order.get(name, len(order)))},
+            "warnings": dict(self.warnings),
+            "profile": self.profile,
+            "memory": self.memory,
+            "preflight": self.preflight,
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets through the first `limit` records of each message, counting the rest.
+
+    Records are grouped by their unformatted message, so "missing driver for
+    row %d" logged for every row counts as one kind of warning. Only records
+    logged by the thread that created the filter are counted, so runs in
+    concurrent jobs keep their warnings apart.
+    """
+
+    def __init__(self, limit=5):
+        super().__init__()
+        self.limit = limit
+        self.counts = {}
+        self.thread = threading.get_ident()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING or record.thread != self.thread:
+            return True
+        key = str(record.msg)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        return self.counts[key] <= self.limit
+
+
+@contextmanager
+def rate_limited_warnings(report, limit=5, logger=None):
+    """Rate-limits warnings logged on logger (the root logger by default)
+    while the block runs, then logs one summary line per message that was
+    suppressed and stores every message's count in report.warnings."""
+    logger = logger or logging.getLogger()
+    rate_limit = RateLimitFilter(limit)
+    logger.addFilter(rate_limit)
+    try:
+        yield rate_limit
+    finally:
+        logger.removeFilter(rate_limit)
+        for message, count in rate_limit.counts.items():
+            report.warnings[message] = report.warnings.get(message, 0) + count
+            if count > limit:
+                logger.warning("Suppressed %d more warnings like: %s", count - limit, message)
+
+
+@contextmanager
+def profiled(report, cprofile=False, memory=False, top=25):
+    """Optionally runs the block under cProfile and/or tracemalloc.
+
+    The cProfile summary (top functions by cumulative time) is stored as text
+    in report.profile; the tracemalloc peak and top allocation sites in
+    report.memory.
+    """
+    profiler = cProfile.Profile() if cprofile else None
+    if memory:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(top)
+            report.profile = output.getvalue()
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            report.memory = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top": [str(stat) for stat in snapshot.statistics("lineno")[:top]],
+            }
@@ -0,0 +1,245 @@
+"""Background payroll jobs for the Streamlit app.
+
+Each submitted job gets its own workspace directory holding its uploads,
+its ZIP and a job.json status file, so concurrent sessions never share
+paths. A JobQueue runs at most max_jobs of them at once on background
+threads; the rest wait in submission order. Jobs report per-driver progress,
+can be cancelled, and are looked up by id, so a page refresh (or a new
+process, via job.json) finds the result again.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import process_excel
+from input_cache import default_cache as default_input_cache
+from instrument import RunReport, profiled
+from preflight import PreflightError
+from sinks import ZipSink
+
+JOBS_ROOT = os.path.join(tempfile.gettempdir(), "excel-processor-jobs")
+
+# Finished jobs (and their workspaces) are deleted this long after they end.
+RETENTION_SECONDS = 24 * 60 * 60
+
+JOB_FILENAME = "job.json"
+ZIP_FILENAME = "output_files.zip"
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised from the progress callback to stop a cancelled job's run."""
+
+
+class Job:
+    """One process_excel run and its workspace.
+
+    status moves from "queued" to "running" to "done", "failed" or
+    "cancelled"; done and total count drivers written so far.
+    """
+
+    def __init__(self, job_id, workspace):
+        self.id = job_id
+        self.workspace = workspace
+        self.status = QUEUED
+        self.done = 0
+        self.total = None
+        self.error = None
+        self.driver_errors = {}
+        self.report = None
+        self.submitted = time.time()
+        self.finished = None
+        self._cancel = threading.Event()
+
+    def path(self, filename):
+        return os.path.join(self.workspace, filename)
+
+    @property
+    def zip_path(self):
+        return self.path(ZIP_FILENAME) if self.status == DONE else None
+
+    def cancel(self):
+        """Asks the job to stop; it does so after the driver in progress."""
+        self._cancel.set()
+
+    def progress(self, done, total):
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.done, self.total = done, total
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "error": self.error,
+            "driver_errors": self.driver_errors,
+            "report": self.report,
+            "submitted": self.submitted,
+            "finished": self.finished,
+        }
+
+    def save(self):
+        temp_path = self.path(JOB_FILENAME + ".tmp")
+        with open(temp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(temp_path, self.path(JOB_FILENAME))
+
+    @classmethod
+    def load(cls, workspace):
+        with open(os.path.join(workspace, JOB_FILENAME)) as f:
+            state = json.load(f)
+        job = cls(state["id"], workspace)
+        for key in ("status", "done", "total", "error", "driver_errors", "report", "submitted", "finished"):
+            setattr(job, key, state[key])
+        if job.status not in FINISHED:
+            # The process that ran it went away.
+            job.status, job.error = FAILED, "Interrupted before it finished"
+        return job
+
+
+class JobQueue:
+    """Runs payroll jobs in the background, at most max_jobs at a time.
+
+    Args:
+        max_jobs: Jobs processed concurrently; later ones wait their turn.
+        root: Directory the job workspaces are created in.
+        input_cache: InputCache shared by the jobs.
+    """
+
+    def __init__(self, max_jobs=2, root=JOBS_ROOT, input_cache=default_input_cache):
+        self.root = root
+        self.input_cache = input_cache
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="payroll-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def submit(self, input_data, template_data, payments_data=None, output_dir=None, compresslevel=0, profile=False, **options):
+        """Queues a job.
+
+        Args:
+            input_data: Bytes of the trips export.
+            template_data: Bytes of the payroll template.
+            payments_data: Optional bytes of the payment export.
+            output_dir: Optional directory to also save the workbooks in.
+            compresslevel: ZIP compression level, as for sinks.ZipSink.
+            profile: Run under cProfile and keep the summary in the report.
+                (tracemalloc is process-wide, so concurrent jobs cannot use it.)
+            **options: Further process_excel keyword arguments (workers,
+                incremental, layout, fast, team_policy, reference_date,
+                timezone, validate).
+
+        Returns:
+            The queued Job.
+        """
+        self.prune()
+        job_id = uuid.uuid4().hex
+        job = Job(job_id, os.path.join(self.root, job_id))
+        os.mkdir(job.workspace)
+        files = {"input.xlsx": input_data, "template.xlsx": template_data, "payments.xlsx": payments_data}
+        for filename, data in files.items():
+            if data is not None:
+                with open(job.path(filename), "wb") as f:
+                    f.write(data)
+        job.save()
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, payments_data is not None, output_dir, compresslevel, profile, options)
+        return job
+
+    def _run(self, job, has_payments, output_dir, compresslevel, profile, options):
+        if job._cancel.is_set():
+            job.status = CANCELLED
+        else:
+            job.status = RUNNING
+            job.save()
+            zip_sink = ZipSink(compresslevel=compresslevel)
+            report = RunReport()
+            try:
+                with profiled(report, cprofile=profile):
+                    processed_drivers = process_excel(
+                        job.path("input.xlsx"), job.path("template.xlsx"), output_dir,
+                        sinks=[zip_sink],
+                        report=report,
+                        payments=job.path("payments.xlsx") if has_payments else None,
+                        input_cache=self.input_cache,
+                        progress=job.progress,
+                        **options,
+                    )
+                with open(job.path(ZIP_FILENAME), "wb") as f:
+                    f.write(zip_sink.getvalue())
+            except JobCancelled:
+                job.status = CANCELLED
+            except PreflightError as exc:
+                # A rejected upload, not a crash; the issues are in report.preflight.
+                job.status, job.error = FAILED, str(exc)
+            except Exception as exc:
+                logging.exception("Payroll job %s failed", job.id)
+                job.status, job.error = FAILED, f"{type(exc).__name__}: {exc}"
+            else:
+                job.status = DONE
+                job.driver_errors = {name: result['error'] for name, result in processed_drivers.items() if 'error' in result}
+            job.report = report.to_dict()
+        job.finished = time.time()
+        job.save()
+
+    def get(self, job_id):
+        """Returns the job with this id, from memory or its job.json, or None."""
+        # Ids come back from the page URL; only ever treat them as a directory name.
+        if not isinstance(job_id, str) or not re.fullmatch(r"[0-9a-f]{32}", job_id):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        try:
+            job = Job.load(os.path.join(self.root, job_id))
+        except (OSError, ValueError, KeyError):
+            return None
+        with self._lock:
+            return self._jobs.setdefault(job_id, job)
+
+    def position(self, job):
+        """How many jobs are ahead of a queued job (0 once it is running)."""
+        if job.status != QUEUED:
+            return 0
+        with self._lock:
+            return sum(1 for other in self._jobs.values() if other.status == QUEUED and other.submitted < job.submitted)
+
+    def counts(self):
+        """Number of queued and running jobs."""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {QUEUED: statuses.count(QUEUED), RUNNING: statuses.count(RUNNING)}
+
+    def prune(self, retention=RETENTION_SECONDS):
+        """Deletes finished jobs, and their workspaces, older than retention."""
+        cutoff = time.time() - retention
+        with self._lock:
+            expired = [job for job in self._jobs.values() if job.status in FINISHED and job.finished and job.finished < cutoff]
+            for job in expired:
+                del self._jobs[job.id]
+            known = {job.workspace for job in self._jobs.values()}
+        for job in expired:
+            shutil.rmtree(job.workspace, ignore_errors=True)
+        # Workspaces left behind by earlier processes.
+        for name in os.listdir(self.root):
+            workspace = os.path.join(self.root, name)
+            if workspace not in known and os.path.isdir(workspace) and os.path.getmtime(workspace) < cutoff:
+                shutil.rmtree(workspace, ignore_errors=True)
+
+
+# One queue per server process, shared by every session, so the job limit
+# holds across dispatchers and jobs outlive the rerun that submitted them.
+default_queue = JobQueue()
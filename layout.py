@@ -0,0 +1,178 @@
+"""Declarative description of where driver data goes on the payroll template.
+
+A layout spec is a plain dict (or JSON file) like DEFAULT_SPEC:
+
+    header        cell -> field written once per sheet (driver name, dates,
+                  the driver's trip count and totals)
+    block         cell -> trip field for the first trip block
+    block_offset  rows between consecutive trip blocks
+    capacity      trip blocks per sheet; if omitted, as many blocks as fit
+                  above the template's last used row
+    sheet         template sheet to fill; the active sheet if omitted
+
+The spec comes from, in order: an explicit dict or JSON path, a sidecar
+"<template>.layout.json" next to the template, "payroll_<field>" defined
+names in the template itself, or DEFAULT_SPEC. compile_layout() turns it
+into a WritePlan of precomputed (row, column, field) tuples once per run;
+rendering a driver then only walks those tuples. Drivers with more trips
+than one sheet holds continue on copies of the template sheet.
+"""
+import copy
+import json
+import math
+import os
+from collections import namedtuple
+
+from openpyxl.utils.cell import coordinate_from_string, column_index_from_string, range_boundaries
+
+from aggregates import TOTAL_FIELDS
+from ingest import PAY_FIELDS
+
+# Totals are the driver's over all their sheets (see aggregates.py).
+HEADER_FIELDS = ("driver_name", "today", "start_date", "end_date") + TOTAL_FIELDS
+# Pay fields stay empty unless the run joins a payment export.
+BLOCK_FIELDS = ("trip_id", "facility_sequence", "estimated_cost", "load_id", "block_id") + PAY_FIELDS
+
+# processed_drivers keys reporting the next free row of each block field;
+# fields not listed report "<field>_row".
+FIELD_ROW_KEYS = {"trip_id": "trip_row", "facility_sequence": "facility_row", "estimated_cost": "estimated_cost_row"}
+
+DEFINED_NAME_PREFIX = "payroll_"
+
+DEFAULT_SPEC = {
+    "sheet": None,
+    "header": {"D3": "today", "D4": "driver_name", "D6": "start_date", "D7": "end_date"},
+    "block": {"B11": "trip_id", "B13": "facility_sequence", "B14": "estimated_cost", "C14": "gross_pay"},
+    "block_offset": 5,
+    "capacity": None,
+}
+
+WritePlan = namedtuple("WritePlan", ["sheet", "header", "blocks", "capacity"])
+WritePlan.__doc__ = """A compiled layout.
+
+sheet is the template sheet name (None for the active sheet); header is a
+tuple of (row, column, field); blocks[slot] is the tuple of (row, column,
+field) for trip block slot on a sheet; capacity is len(blocks).
+"""
+
+
+def _cell(coordinate):
+    column, row = coordinate_from_string(coordinate.replace("$", ""))
+    return row, column_index_from_string(column)
+
+
+def sidecar_path(template_file):
+    """Returns the "<template>.layout.json" path for a template path, or None."""
+    if not isinstance(template_file, (str, os.PathLike)):
+        return None
+    return os.path.splitext(os.fspath(template_file))[0] + ".layout.json"
+
+
+def spec_from_defined_names(workbook):
+    """Builds a spec from "payroll_<field>" defined names, or returns None.
+
+    Header and block cells are names referring to a single cell, e.g.
+    payroll_driver_name -> 'Sheet 1'!$D$4; payroll_block_offset and
+    payroll_capacity are named constants.
+    """
+    names = {name[len(DEFINED_NAME_PREFIX):]: defined for name, defined in workbook.defined_names.items() if name.startswith(DEFINED_NAME_PREFIX)}
+    if not names:
+        return None
+
+    spec = {"sheet": None, "header": {}, "block": {}, "block_offset": DEFAULT_SPEC["block_offset"], "capacity": None}
+    for field, defined in names.items():
+        if field in ("block_offset", "capacity"):
+            spec[field] = int(defined.attr_text)
+            continue
+        sheet, coordinate = next(defined.destinations)
+        spec["sheet"] = sheet
+        if field in HEADER_FIELDS:
+            spec["header"][coordinate.replace("$", "")] = field
+        else:
+            spec["block"][coordinate.replace("$", "")] = field
+    return spec
+
+
+def load_spec(layout=None, template_file=None, template_workbook=None):
+    """Resolves the layout spec for a run.
+
+    Args:
+        layout: A spec dict, a path to a JSON spec, or None to look for one
+            next to / inside the template.
+        template_file: The template path, used to find a sidecar file.
+        template_workbook: A parsed template, searched for defined names.
+    """
+    if isinstance(layout, dict):
+        spec = copy.deepcopy(layout)
+    elif layout is not None:
+        with open(layout) as f:
+            spec = json.load(f)
+    else:
+        path = sidecar_path(template_file)
+        spec = None
+        if path and os.path.exists(path):
+            with open(path) as f:
+                spec = json.load(f)
+        if spec is None and template_workbook is not None:
+            spec = spec_from_defined_names(template_workbook)
+        if spec is None:
+            spec = copy.deepcopy(DEFAULT_SPEC)
+
+    for key, default in DEFAULT_SPEC.items():
+        spec.setdefault(key, copy.deepcopy(default))
+    return spec
+
+
+def compile_layout(spec, template_workbook):
+    """Compiles a spec against the template into a WritePlan.
+
+    Raises:
+        ValueError: If the spec names an unknown field, has no Trip ID cell
+            or its first block does not fit on the template.
+    """
+    for field in spec["header"].values():
+        if field not in HEADER_FIELDS:
+            raise ValueError(f"Unknown header field in layout: {field}")
+    for field in spec["block"].values():
+        if field not in BLOCK_FIELDS:
+            raise ValueError(f"Unknown trip field in layout: {field}")
+    if "trip_id" not in spec["block"].values():
+        raise ValueError("Layout has no cell for trip_id")
+
+    worksheet = template_workbook[spec["sheet"]] if spec["sheet"] else template_workbook.active
+    header = tuple(_cell(coordinate) + (field,) for coordinate, field in spec["header"].items())
+    first_block = tuple(_cell(coordinate) + (field,) for coordinate, field in spec["block"].items())
+    offset = spec["block_offset"]
+
+    capacity = spec["capacity"]
+    if capacity is None:
+        # As many blocks as fit above the last row the template uses (its totals).
+        last_row = range_boundaries(worksheet.calculate_dimension())[3]
+        lowest = max(row for row, _, _ in first_block)
+        capacity = (last_row - 1 - lowest) // offset + 1 if offset else 1
+    if capacity < 1:
+        raise ValueError("Layout's first trip block does not fit on the template")
+
+    blocks = tuple(
+        tuple((row + slot * offset, column, field) for row, column, field in first_block)
+        for slot in range(capacity)
+    )
+    return WritePlan(spec["sheet"], header, blocks, capacity)
+
+
+def page_count(plan, trip_count):
+    """Number of template sheets needed for trip_count trips."""
+    return max(1, math.ceil(trip_count / plan.capacity))
+
+
+def next_free_rows(plan, trip_count):
+    """The processed_drivers entry after trip_count trips: the next free row
+    of each block field on the last sheet, and the number of sheets used."""
+    pages = page_count(plan, trip_count)
+    slot = trip_count - (pages - 1) * plan.capacity
+    offset = plan.blocks[1][0][0] - plan.blocks[0][0][0] if plan.capacity > 1 else 0
+    entry = {}
+    for row, _, field in plan.blocks[0]:
+        entry[FIELD_ROW_KEYS.get(field, f"{field}_row")] = row + slot * offset
+    entry['sheets'] = pages
+    return entry
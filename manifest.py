@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+
+from layout import BLOCK_FIELDS
+
+MANIFEST_FILENAME = ".payroll_manifest.json"
+
+
+def driver_fingerprint(driver_name, trips, *parts):
+    """Hashes everything that ends up in a driver's workbook.
+
+    Args:
+        driver_name: The driver's name as written to the sheet.
+        trips: The driver's ingest.Trip records.
+        *parts: Anything else the output depends on, such as the template
+            key and the pay period.
+    """
+    digest = hashlib.sha256()
+    digest.update(repr(driver_name).encode())
+    for trip in trips:
+        digest.update(repr(tuple(getattr(trip, field) for field in BLOCK_FIELDS)).encode())
+    for part in parts:
+        digest.update(repr(part).encode())
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Records which driver and fingerprint produced each file in output_dir.
+
+    The manifest lives next to the workbooks as MANIFEST_FILENAME and maps
+    every output filename to {"driver": name, "hash": fingerprint}.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_FILENAME)
+        try:
+            with open(self.path) as f:
+                self.files = json.load(f)
+        except (OSError, ValueError):
+            self.files = {}
+
+    def is_current(self, filename, fingerprint):
+        """True if filename exists on disk and was rendered from fingerprint."""
+        entry = self.files.get(filename)
+        return entry is not None and entry["hash"] == fingerprint and os.path.exists(os.path.join(self.output_dir, filename))
+
+    def record(self, filename, driver_name, fingerprint):
+        self.files[filename] = {"driver": driver_name, "hash": fingerprint}
+
+    def forget(self, filename):
+        self.files.pop(filename, None)
+
+    def remove_stale(self, current_filenames):
+        """Deletes the files of drivers that are no longer in the run.
+
+        Returns:
+            The list of filenames removed.
+        """
+        stale = [filename for filename in self.files if filename not in current_filenames]
+        for filename in stale:
+            try:
+                os.remove(os.path.join(self.output_dir, filename))
+            except FileNotFoundError:
+                pass
+            del self.files[filename]
+        return stale
+
+    def save(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.files, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,179 @@
+"""Joins the carrier's payment export onto the trips export.
+
+The "Payment Details" sheet has one row per paid item. LOAD rows carry a
+Load ID; TOUR rows carry a Trip ID ("T-...") without one and pay the tour as
+a whole; block-level rows carry only a Block ID. index_payments() streams
+the sheet once into three hash maps keyed on those IDs, and join_payments()
+walks the trips once, so the join is linear in both files however large
+the payment export is.
+
+A trip row takes the pay of the LOAD rows with its Load ID (its Trip ID if
+the export has no Load ID column). A tour's or block's own pay goes onto
+the first trip row of that tour or block, so it is counted once. Several
+payment rows for the same key are summed.
+
+Only the Block ID, Trip ID and the fuel, tolls, detention, TONU and gross
+pay columns are required; Load ID, Base Rate and Others are read when the
+export has them.
+"""
+from collections import namedtuple
+from operator import attrgetter
+
+import openpyxl
+
+from ingest import MAX_HEADER_ROWS, PAY_FIELDS, find_header
+from xlsx_reader import open_rows, sheet_names
+
+PAYMENT_SHEET = "Payment Details"
+
+# Written next to the driver workbooks when a run joins a payment export.
+UNMATCHED_REPORT_FILENAME = "_unmatched_trips.xlsx"
+
+KEY_COLUMNS = ("Block ID", "Trip ID", "Load ID")
+PAY_COLUMNS = {
+    "Base Rate": "base_rate",
+    "Fuel Surcharge": "fuel_surcharge",
+    "Tolls": "tolls",
+    "Detention": "detention",
+    "TONU": "tonu",
+    "Others": "others",
+    "Gross Pay": "gross_pay",
+}
+
+# Read when present; a missing one reads as blank.
+OPTIONAL_COLUMNS = ("Load ID", "Base Rate", "Others")
+
+Pay = namedtuple("Pay", PAY_FIELDS)
+
+PaymentRow = namedtuple("PaymentRow", ["block_id", "trip_id", "load_id", "pay", "row_number"])
+
+
+def _add(total, pay):
+    return pay if total is None else Pay(*(round(a + b, 2) for a, b in zip(total, pay)))
+
+
+def _amount(value):
+    return value if isinstance(value, (int, float)) else 0
+
+
+def iter_payment_rows(payments_file, max_header_rows=MAX_HEADER_ROWS):
+    """Streams the rows of the "Payment Details" sheet that name a trip.
+
+    Args:
+        payments_file: Path or binary file-like object of the payment export.
+        max_header_rows: Number of rows to scan for the header.
+
+    Yields:
+        A PaymentRow per row with a Block ID, Trip ID or Load ID; totals
+        and footer rows are skipped. Blank amounts count as 0.
+    """
+    sheet = PAYMENT_SHEET if PAYMENT_SHEET in sheet_names(payments_file) else None
+    with open_rows(payments_file, sheet) as rows:
+        names = KEY_COLUMNS + tuple(PAY_COLUMNS)
+        required = tuple(name for name in names if name not in OPTIONAL_COLUMNS)
+        header_row, columns = find_header(rows, max_header_rows, columns=required, optional=OPTIONAL_COLUMNS)
+        rows.columns = tuple(columns.get(name) for name in names)
+
+        for row_number, row in enumerate(rows, header_row + 1):
+            if not row:
+                continue
+            block_id, trip_id, load_id = (value or None for value in row[:3])
+            if block_id or trip_id or load_id:
+                yield PaymentRow(block_id, trip_id, load_id, Pay(*(_amount(value) for value in row[3:])), row_number)
+
+
+class PaymentIndex:
+    """Payment rows hashed by Load ID, tour Trip ID and Block ID.
+
+    Build it once with index_payments() and reuse it for every driver, or
+    for every trips export checked against the same payment file.
+    """
+
+    def __init__(self):
+        # kind -> {id: summed Pay}, kind being "load", "tour" or "block".
+        self.pay = {"load": {}, "tour": {}, "block": {}}
+        # (kind, id) -> the PaymentRows summed into that entry.
+        self.rows = {}
+
+    def add(self, payment):
+        if payment.load_id:
+            key = ("load", payment.load_id)
+        elif payment.trip_id:
+            key = ("tour", payment.trip_id)
+        else:
+            key = ("block", payment.block_id)
+        pay = self.pay[key[0]]
+        pay[key[1]] = _add(pay.get(key[1]), payment.pay)
+        self.rows.setdefault(key, []).append(payment)
+
+    def __len__(self):
+        return sum(len(rows) for rows in self.rows.values())
+
+
+def index_payments(payments_file):
+    """Builds a PaymentIndex from a payment export path or file-like object.
+
+    An existing PaymentIndex is returned as is.
+    """
+    if isinstance(payments_file, PaymentIndex):
+        return payments_file
+    index = PaymentIndex()
+    for payment in iter_payment_rows(payments_file):
+        index.add(payment)
+    return index
+
+
+def join_payments(trips_by_driver, index):
+    """Copies matching pay onto every trip.
+
+    Args:
+        trips_by_driver: Dict as returned by engine.group_trips.
+        index: PaymentIndex of the payment export.
+
+    Returns:
+        (joined, unmatched_trips, unmatched_payments): joined is
+        trips_by_driver with each ingest.Trip's pay fields filled in;
+        unmatched_trips lists the trips no payment row matched, in input
+        order; unmatched_payments lists the PaymentRows no trip matched, in
+        payment file order.
+    """
+    used = set()
+    joined_rows = {}
+    unmatched_trips = []
+    # Export row order, not driver order: a tour can span several Driver
+    # Name strings, and its pay belongs on its first row.
+    trips = sorted((trip for driver_trips in trips_by_driver.values() for trip in driver_trips), key=attrgetter("row_number"))
+    for trip in trips:
+        pay = index.pay["load"].get(trip.load_id or trip.trip_id)
+        if pay is not None:
+            used.add(("load", trip.load_id or trip.trip_id))
+        for kind, value in (("tour", trip.trip_id), ("block", trip.block_id)):
+            if value in index.pay[kind] and (kind, value) not in used:
+                pay = _add(pay, index.pay[kind][value])
+                used.add((kind, value))
+        if pay is None:
+            unmatched_trips.append(trip)
+            joined_rows[trip.row_number] = trip
+        else:
+            joined_rows[trip.row_number] = trip._replace(**pay._asdict())
+    joined = {driver_name: [joined_rows[trip.row_number] for trip in driver_trips] for driver_name, driver_trips in trips_by_driver.items()}
+
+    unmatched_payments = [payment for key, rows in index.rows.items() if key not in used for payment in rows]
+    unmatched_payments.sort(key=lambda payment: payment.row_number)
+    return joined, unmatched_trips, unmatched_payments
+
+
+def unmatched_report(unmatched_trips, unmatched_payments):
+    """Builds a workbook listing the trips without pay and the payments
+    without a trip."""
+    workbook = openpyxl.Workbook(write_only=True)
+    trips_sheet = workbook.create_sheet("Unmatched Trips")
+    trips_sheet.append(["Row", "Trip ID", "Load ID", "Block ID", "Driver Name", "Facility Sequence", "Estimated Cost"])
+    for trip in unmatched_trips:
+        trips_sheet.append([trip.row_number, trip.trip_id, trip.load_id, trip.block_id, trip.driver_name, trip.facility_sequence, trip.estimated_cost])
+
+    payments_sheet = workbook.create_sheet("Unmatched Payments")
+    payments_sheet.append(["Row", "Trip ID", "Load ID", "Block ID", *PAY_COLUMNS])
+    for payment in unmatched_payments:
+        payments_sheet.append([payment.row_number, payment.trip_id, payment.load_id, payment.block_id, *payment.pay])
+    return workbook
@@ -0,0 +1,245 @@
+"""Checks a trips export before anything is rendered.
+
+preflight() streams the export once through the same projected reader as
+ingest.iter_trips and checks, row by row: the header, the type of every
+target column, empty keys, duplicate trips and how many trips each driver
+has against the layout's capacity. It returns a PreflightReport of
+issues, each with its count and the first few row numbers, so a bad upload
+is turned away before minutes go into rendering and saving workbooks.
+
+Errors make the run pointless (missing columns, no trips, empty or
+duplicate Trip IDs); warnings flag rows the run handles but that are
+probably wrong (empty Driver Name rows are skipped, non-numeric costs count
+as 0 in the totals, busy drivers continue on extra sheets).
+"""
+import json
+import time
+import zipfile
+from collections import namedtuple
+
+from openpyxl.utils.exceptions import InvalidFileException
+
+from drivers import DriverIndex
+from ingest import MAX_HEADER_ROWS, OPTIONAL_COLUMNS, MissingColumns, find_header, trips_from_rows
+from xlsx_reader import open_rows
+
+ERROR, WARNING = "error", "warning"
+
+# Row numbers kept per issue; the count covers all of them.
+SAMPLE_ROWS = 10
+
+Issue = namedtuple("Issue", ["severity", "code", "message", "count", "rows"])
+Issue.__doc__ = """One kind of problem found by preflight.
+
+rows holds the first SAMPLE_ROWS row numbers it was found on (empty for
+issues about the whole file); count is how often it was found.
+"""
+
+# What reading a file that is not a usable xlsx export can raise, beyond a
+# missing header: a .csv (InvalidFileException), a zip that is not a
+# workbook (KeyError, BadZipFile), an unreadable path (OSError).
+READ_ERRORS = (OSError, KeyError, zipfile.BadZipFile, InvalidFileException)
+
+# code -> (severity, message)
+CHECKS = {
+    "empty_trip_id": (ERROR, "Trip ID is empty"),
+    "duplicate_trip": (ERROR, "Trip ID and Load ID repeat an earlier row"),
+    "bad_trip_id": (ERROR, "Trip ID is neither text nor a whole number"),
+    "empty_driver": (WARNING, "Driver Name is empty; the trip will be skipped"),
+    "bad_driver": (WARNING, "Driver Name is not text"),
+    "empty_estimated_cost": (WARNING, "Estimated Cost is empty"),
+    "bad_estimated_cost": (WARNING, "Estimated Cost is not a number; it counts as 0 in the totals"),
+    "empty_facility_sequence": (WARNING, "Facility Sequence is empty"),
+}
+
+
+class PreflightError(ValueError):
+    """Raised by process_excel(validate=True) when preflight finds errors."""
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__("; ".join(describe(issue) for issue in report.errors))
+
+
+def describe(issue):
+    """One-line text for an Issue, with its count and sample rows."""
+    if not issue.rows:
+        return issue.message
+    more = ", ..." if issue.count > len(issue.rows) else ""
+    return f"{issue.message} ({issue.count} rows: {', '.join(map(str, issue.rows))}{more})"
+
+
+def rejected(exc):
+    """A PreflightReport for an export that could not be read: exc is a
+    MissingColumns or one of READ_ERRORS."""
+    report = PreflightReport()
+    if isinstance(exc, MissingColumns):
+        report.add(ERROR, "missing_columns", str(exc))
+    else:
+        report.add(ERROR, "unreadable", f"Cannot read the input file: {exc}")
+    return report
+
+
+class PreflightReport:
+    """What preflight found in one trips export."""
+
+    def __init__(self):
+        self.header_row = None
+        # Target and optional column name -> 0-based index in the export.
+        self.columns = {}
+        self.rows = 0
+        self.blank_rows = 0
+        self.drivers = 0
+        self.issues = []
+        self.seconds = 0.0
+        self._found = {}
+
+    def found(self, code, row_number):
+        """Counts one occurrence of a CHECKS issue on a row."""
+        entry = self._found.get(code)
+        if entry is None:
+            entry = self._found[code] = [0, []]
+        entry[0] += 1
+        if len(entry[1]) < SAMPLE_ROWS:
+            entry[1].append(row_number)
+
+    def add(self, severity, code, message, count=1, rows=()):
+        self.issues.append(Issue(severity, code, message, count, list(rows)))
+
+    def _close(self):
+        for code, (count, rows) in self._found.items():
+            severity, message = CHECKS[code]
+            self.add(severity, code, message, count, rows)
+        self._found = {}
+        self.issues.sort(key=lambda issue: (issue.severity != ERROR, -issue.count))
+
+    @property
+    def errors(self):
+        return [issue for issue in self.issues if issue.severity == ERROR]
+
+    @property
+    def warnings(self):
+        return [issue for issue in self.issues if issue.severity == WARNING]
+
+    @property
+    def ok(self):
+        """True if there are no errors; warnings do not stop a run."""
+        return not self.errors
+
+    def to_dict(self):
+        return {
+            "ok": self.ok,
+            "header_row": self.header_row,
+            "columns": dict(self.columns),
+            "rows": self.rows,
+            "blank_rows": self.blank_rows,
+            "drivers": self.drivers,
+            "seconds": round(self.seconds, 6),
+            "issues": [issue._asdict() for issue in self.issues],
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def check_trips(trips, report, plan=None, driver_index=None):
+    """Runs the row checks over ingest.Trip records and fills report.
+
+    Args:
+        trips: Iterable of ingest.Trip records, e.g. from iter_trips.
+        report: PreflightReport to fill.
+        plan: Optional layout.WritePlan; drivers with more trips than
+            plan.capacity are reported.
+        driver_index: drivers.DriverIndex team strings are split with.
+    """
+    if driver_index is None:
+        driver_index = DriverIndex()
+    found = report.found
+    seen = set()
+    trip_counts = {}
+    for trip in trips:
+        row_number = trip.row_number
+        trip_id, driver_name, facility_sequence, estimated_cost = trip.trip_id, trip.driver_name, trip.facility_sequence, trip.estimated_cost
+        if trip_id is None and driver_name is None and facility_sequence is None and estimated_cost is None:
+            # A row with cells only outside the target columns, e.g. a totals line.
+            report.blank_rows += 1
+            continue
+        report.rows += 1
+
+        if trip_id is None or trip_id == "":
+            found("empty_trip_id", row_number)
+        elif not isinstance(trip_id, (str, int)) or isinstance(trip_id, bool):
+            found("bad_trip_id", row_number)
+        else:
+            key = (trip_id, trip.load_id)
+            if key in seen:
+                found("duplicate_trip", row_number)
+            else:
+                seen.add(key)
+
+        if driver_name is None or driver_name == "":
+            found("empty_driver", row_number)
+        elif not isinstance(driver_name, str):
+            found("bad_driver", row_number)
+        else:
+            members = driver_index.members(driver_name)
+            if not members:
+                found("empty_driver", row_number)
+            for member in members:
+                trip_counts[member] = trip_counts.get(member, 0) + 1
+
+        if estimated_cost is None or estimated_cost == "":
+            found("empty_estimated_cost", row_number)
+        elif not _is_number(estimated_cost):
+            found("bad_estimated_cost", row_number)
+
+        if facility_sequence is None or facility_sequence == "":
+            found("empty_facility_sequence", row_number)
+
+    report.drivers = len(trip_counts)
+    if not report.rows:
+        report.add(ERROR, "no_trips", "The export has no trip rows below the header")
+    if plan is not None:
+        busy = sorted((key for key, count in trip_counts.items() if count > plan.capacity), key=trip_counts.get, reverse=True)
+        if busy:
+            names = ", ".join(f"{driver_index.names[key]} ({trip_counts[key]})" for key in busy[:SAMPLE_ROWS])
+            report.add(
+                WARNING, "over_capacity",
+                f"{len(busy)} drivers have more trips than one sheet holds ({plan.capacity}) and continue on extra sheets: {names}",
+                len(busy),
+            )
+    report._close()
+    return report
+
+
+def preflight(input_file, plan=None, max_header_rows=MAX_HEADER_ROWS, driver_index=None):
+    """Checks a trips export in a single streamed pass.
+
+    Args:
+        input_file: Path or binary file-like object of the trips export.
+            File-like objects are rewound afterwards, ready for the run.
+        plan: Optional layout.WritePlan to check driver capacity against.
+        max_header_rows: Number of rows to scan for the header.
+        driver_index: drivers.DriverIndex team strings are split with.
+
+    Returns:
+        A PreflightReport. Unreadable files and missing header columns are
+        reported as errors rather than raised.
+    """
+    start = time.perf_counter()
+    try:
+        with open_rows(input_file) as rows:
+            report = PreflightReport()
+            report.header_row, report.columns = find_header(rows, max_header_rows, optional=OPTIONAL_COLUMNS)
+            check_trips(trips_from_rows(rows, report.header_row, report.columns), report, plan, driver_index)
+    except (MissingColumns,) + READ_ERRORS as exc:
+        report = rejected(exc)
+    finally:
+        if hasattr(input_file, "seek"):
+            input_file.seek(0)
+    report.seconds = time.perf_counter() - start
+    return report
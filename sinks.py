@@ -0,0 +1,78 @@
+import os
+import tempfile
+import zipfile
+
+# ZIP bodies larger than this spill from memory to a file in the system temp directory.
+SPOOL_MAX_MEMORY = 64 * 1024 * 1024
+
+
+class DirectorySink:
+    """Writes each rendered workbook to a file in output_dir."""
+
+    # Run report stage the sink's writes are timed under.
+    stage = "disk write"
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+
+    def add(self, filename, data):
+        with open(os.path.join(self.output_dir, filename), "wb") as f:
+            f.write(data)
+
+    def close(self):
+        pass
+
+
+class ZipSink:
+    """Streams rendered workbooks into a ZIP archive held in memory.
+
+    The archive is built in a SpooledTemporaryFile, so nothing is written to
+    the working directory and only very large runs touch disk at all.
+
+    Args:
+        compresslevel: 0 stores entries uncompressed; 1-9 DEFLATE them at
+            that level. xlsx files are already DEFLATE-compressed, so storing
+            them costs a few percent of size and saves most of the CPU.
+        max_memory: Archive size above which the buffer spills to disk.
+    """
+
+    stage = "zip"
+
+    def __init__(self, compresslevel=0, max_memory=SPOOL_MAX_MEMORY):
+        self._buffer = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        if compresslevel:
+            self._zipfile = zipfile.ZipFile(self._buffer, "w", zipfile.ZIP_DEFLATED, compresslevel=compresslevel)
+        else:
+            self._zipfile = zipfile.ZipFile(self._buffer, "w", zipfile.ZIP_STORED)
+
+    def add(self, filename, data):
+        self._zipfile.writestr(filename, data)
+
+    def close(self):
+        """Finishes the archive; further add() calls are not allowed."""
+        self._zipfile.close()
+
+    def getvalue(self):
+        """Finishes the archive and returns its bytes."""
+        self.close()
+        self._buffer.seek(0)
+        return self._buffer.read()
+
+
+class PrefixedSink:
+    """Adds every file to another sink under a folder prefix."""
+
+    def __init__(self, sink, prefix):
+        self.sink = sink
+        self.prefix = prefix
+
+    @property
+    def stage(self):
+        return self.sink.stage
+
+    def add(self, filename, data):
+        self.sink.add(f"{self.prefix}/{filename}", data)
+
+    def close(self):
+        pass
@@ -0,0 +1,85 @@
+import hashlib
+import io
+import pickle
+import threading
+from collections import OrderedDict
+
+import openpyxl
+
+
+def read_bytes(source):
+    """Returns the raw bytes of a path, bytes object or binary file-like object."""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, "read"):
+        position = source.tell() if hasattr(source, "tell") else None
+        data = source.read()
+        if position is not None:
+            source.seek(position)
+        return data
+    with open(source, "rb") as f:
+        return f.read()
+
+
+class ParsedTemplate:
+    """A template workbook parsed once and cloned in memory for every driver.
+
+    The parsed workbook is kept as a pickle snapshot: unpickling rebuilds the
+    cell graph several times faster than openpyxl re-reading the xlsx, and
+    every clone is independent of the others.
+    """
+
+    def __init__(self, key, workbook):
+        self.key = key
+        self._snapshot = pickle.dumps(workbook, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def clone(self):
+        """Returns a fresh, independent copy of the template workbook."""
+        return pickle.loads(self._snapshot)
+
+
+class TemplateCache:
+    """Parsed templates keyed on the SHA-256 of the template file's content.
+
+    Args:
+        max_entries: Number of distinct templates kept before the least
+            recently used one is dropped.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._templates = OrderedDict()
+        # Background jobs share the cache across threads.
+        self._lock = threading.Lock()
+
+    def get(self, template_file):
+        """Returns the ParsedTemplate for a template, parsing it on first use.
+
+        Args:
+            template_file: Path, bytes or binary file-like object of the template.
+        """
+        data = read_bytes(template_file)
+        key = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                return template
+        template = ParsedTemplate(key, openpyxl.load_workbook(io.BytesIO(data)))
+        with self._lock:
+            self._templates[key] = template
+            if len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+        return template
+
+    def clone(self, template_file):
+        """Shorthand for get(template_file).clone()."""
+        return self.get(template_file).clone()
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+
+# Shared by every run in the process, so Streamlit reruns with the same upload skip parsing.
+default_cache = TemplateCache()
@@ -0,0 +1,29 @@
+"""Driver names to people and to output filenames."""
+from aggregates import SUMMARY_FILENAME
+from drivers import DriverIndex, output_filenames
+from ingest import Trip
+from payments import UNMATCHED_REPORT_FILENAME
+
+
+def test_output_filenames_deduplicate_unsafe_names():
+    filenames = output_filenames(["A/B", "A:B", "a_b", "CON"])
+    assert filenames == {"A/B": "A_B.xlsx", "A:B": "A_B (2).xlsx", "a_b": "a_b (3).xlsx", "CON": "_CON.xlsx"}
+
+
+def test_output_filenames_never_take_run_files():
+    filenames = output_filenames(["_summary", "_Unmatched_Trips", "Ann Lee"])
+    assert filenames == {"_summary": "_summary (2).xlsx", "_Unmatched_Trips": "_Unmatched_Trips (2).xlsx", "Ann Lee": "Ann Lee.xlsx"}
+    assert SUMMARY_FILENAME not in filenames.values()
+    assert UNMATCHED_REPORT_FILENAME.casefold() not in {filename.casefold() for filename in filenames.values()}
+
+
+def test_regroup_splits_team_names():
+    trips = {
+        "Ann Lee": [Trip("T1", "Ann Lee", "A->B", 100, 3)],
+        "ann  lee;Bo Chen": [Trip("T2", "ann  lee;Bo Chen", "A->B", 50, 2)],
+    }
+    shared, _ = DriverIndex("share").regroup(trips)
+    split, _ = DriverIndex("split").regroup(trips)
+    assert [trip.row_number for trip in shared["Ann Lee"]] == [2, 3]
+    assert [trip.estimated_cost for trip in shared["Bo Chen"]] == [50]
+    assert [trip.estimated_cost for trip in split["Bo Chen"]] == [25]
@@ -0,0 +1,74 @@
+"""The fast writer's output against the openpyxl path's, part by part."""
+import io
+import os
+import zipfile
+from datetime import date
+
+import pytest
+
+import engine
+from aggregates import aggregate
+from drivers import DriverIndex
+from fast_writer import Unsupported, compile_skeleton
+from ingest import Trip, iter_trips
+from layout import compile_layout, load_spec
+from template_cache import TemplateCache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_FILE = os.path.join(ROOT, "template", "payroll_template.xlsx")
+INPUT_FILE = os.path.join(ROOT, "input", "trips.xlsx")
+
+AWKWARD_TRIPS = [
+    Trip("  padded  ", None, "A&B <C>", 0.1 + 0.2, 3),
+    Trip(12345678901234567, None, True, -0.0, 4),
+    Trip("=1+2", None, "", 1e-20, 5),
+    Trip("1122KYRNF", None, None, None, 6),
+    Trip("Ünïcode ✓", None, "tab\tand\nnewline", 10**15, 7),
+]
+
+
+@pytest.fixture(scope="module")
+def setup():
+    template = TemplateCache().get(TEMPLATE_FILE)
+    plan = compile_layout(load_spec(None, TEMPLATE_FILE, template.clone()), template.clone())
+    return template, plan, compile_skeleton(template, plan), engine.pay_period(date(2024, 11, 6))
+
+
+def sample_drivers():
+    trips = list(iter_trips(INPUT_FILE))
+    trips_by_driver, _ = DriverIndex().regroup(engine.group_trips(trips))
+    aggregates = aggregate(trips_by_driver, trips)
+    return {name: (driver_trips, aggregates.totals(name)) for name, driver_trips in trips_by_driver.items()}
+
+
+SAMPLE = sample_drivers()
+CASES = dict(SAMPLE)
+CASES["Awkward & <Values>"] = (AWKWARD_TRIPS, None)
+
+
+def parts(data):
+    # core.xml holds the save time, which differs between any two saves.
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return {name: archive.read(name) for name in archive.namelist() if name != "docProps/core.xml"}
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_fast_writer_matches_openpyxl(setup, name):
+    template, plan, skeleton, period = setup
+    trips, totals = CASES[name]
+    if len(trips) > plan.capacity:
+        with pytest.raises(Unsupported):
+            skeleton.render(engine.header_context(name, period, totals), trips)
+        return
+    _, expected = engine.render_file(template, name, trips, period, plan, totals=totals)
+    actual = skeleton.render(engine.header_context(name, period, totals), trips)
+    assert parts(actual) == parts(expected)
+
+
+def test_render_file_falls_back_for_overflow(setup):
+    template, plan, skeleton, period = setup
+    name, (trips, totals) = next((name, case) for name, case in SAMPLE.items() if len(case[0]) > plan.capacity)
+    entry, fast = engine.render_file(template, name, trips, period, plan, skeleton, totals=totals)
+    _, expected = engine.render_file(template, name, trips, period, plan, totals=totals)
+    assert "error" not in entry
+    assert parts(fast) == parts(expected)
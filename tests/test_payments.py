@@ -0,0 +1,71 @@
+"""Matching rules of the trips to payments join."""
+from ingest import Trip
+from payments import Pay, PaymentIndex, PaymentRow, join_payments
+
+
+def pay(gross, base=0, fuel=0):
+    return Pay(base, fuel, 0, 0, 0, 0, gross)
+
+
+def index(*payments):
+    payment_index = PaymentIndex()
+    for row_number, (block_id, trip_id, load_id, amounts) in enumerate(payments, 2):
+        payment_index.add(PaymentRow(block_id, trip_id, load_id, amounts, row_number))
+    return payment_index
+
+
+def trip(trip_id, row_number, load_id=None, block_id=None, driver_name="Ann Lee"):
+    return Trip(trip_id, driver_name, "A->B", 100, row_number, load_id, block_id)
+
+
+def gross(joined):
+    return {trip.row_number: trip.gross_pay for trips in joined.values() for trip in trips}
+
+
+def test_load_id_matches_load_rows():
+    joined, unmatched_trips, unmatched_payments = join_payments(
+        {"Ann Lee": [trip("T-1", 2, load_id="L1"), trip("T-2", 3, load_id="L2")]},
+        index((None, "T-9", "L1", pay(120, base=100, fuel=20)), (None, None, "L2", pay(80))),
+    )
+    assert gross(joined) == {2: 120, 3: 80}
+    assert joined["Ann Lee"][0].base_rate == 100 and joined["Ann Lee"][0].fuel_surcharge == 20
+    assert unmatched_trips == [] and unmatched_payments == []
+
+
+def test_trip_id_matches_without_load_id():
+    joined, _, _ = join_payments({"Ann Lee": [trip("T-1", 2)]}, index((None, None, "T-1", pay(55))))
+    assert gross(joined) == {2: 55}
+
+
+def test_rows_for_one_key_are_summed():
+    joined, _, _ = join_payments(
+        {"Ann Lee": [trip("T-1", 2, load_id="L1")]},
+        index((None, None, "L1", pay(100.1)), (None, None, "L1", pay(0.2)), (None, None, "L1", pay(-10))),
+    )
+    assert gross(joined) == {2: 90.3}
+
+
+def test_tour_and_block_pay_go_on_the_first_row_in_export_order():
+    # Bo Chen's name string comes first in the grouping, Ann Lee's row first in the export.
+    trips_by_driver = {
+        "Bo Chen": [trip("T-TOUR", 5, load_id="L5", block_id="B-1", driver_name="Bo Chen")],
+        "Ann Lee": [trip("T-TOUR", 3, load_id="L3", block_id="B-1"), trip("T-TOUR", 7, load_id="L7", block_id="B-1")],
+    }
+    joined, unmatched_trips, unmatched_payments = join_payments(
+        trips_by_driver,
+        index((None, "T-TOUR", None, pay(300)), ("B-1", None, None, pay(40)), (None, None, "L5", pay(10))),
+    )
+    assert gross(joined) == {3: 340, 5: 10, 7: None}
+    assert list(joined) == ["Bo Chen", "Ann Lee"]
+    assert [trip.row_number for trip in unmatched_trips] == [7]
+    assert unmatched_payments == []
+
+
+def test_unmatched_trips_and_payments_in_file_order():
+    joined, unmatched_trips, unmatched_payments = join_payments(
+        {"Bo Chen": [trip("T-4", 4, load_id="L4", driver_name="Bo Chen")], "Ann Lee": [trip("T-2", 2, load_id="L2")]},
+        index((None, None, "L9", pay(1)), (None, None, "L4", pay(2)), ("B-9", None, None, pay(3))),
+    )
+    assert gross(joined) == {4: 2, 2: None}
+    assert [trip.row_number for trip in unmatched_trips] == [2]
+    assert [payment.row_number for payment in unmatched_payments] == [2, 4]
@@ -0,0 +1,49 @@
+"""process_excel(validate=True) and preflight() reject the same bad exports the same way."""
+import io
+import os
+
+import openpyxl
+import pytest
+
+from engine import process_excel
+from instrument import RunReport
+from preflight import PreflightError, preflight
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_FILE = os.path.join(ROOT, "template", "payroll_template.xlsx")
+INPUT_FILE = os.path.join(ROOT, "input", "trips.xlsx")
+
+
+def workbook_bytes(rows):
+    workbook = openpyxl.Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+BAD_EXPORTS = {
+    "unreadable": b"not an xlsx file",
+    "missing_columns": workbook_bytes([["Trip ID", "Driver"], ["T1", "Ann Lee"]]),
+    "empty_trip_id": workbook_bytes([["Trip ID", "Driver Name", "Facility Sequence", "Estimated Cost"], [None, "Ann Lee", "A->B", 10]]),
+    "no_trips": workbook_bytes([["Trip ID", "Driver Name", "Facility Sequence", "Estimated Cost"]]),
+}
+
+
+@pytest.mark.parametrize("code", BAD_EXPORTS)
+def test_validate_rejects_with_preflight_issues(code):
+    report = RunReport()
+    with pytest.raises(PreflightError) as raised:
+        process_excel(io.BytesIO(BAD_EXPORTS[code]), TEMPLATE_FILE, report=report, validate=True)
+    assert [issue.code for issue in raised.value.report.errors] == [code]
+    assert report.preflight["issues"] == preflight(io.BytesIO(BAD_EXPORTS[code])).to_dict()["issues"]
+
+
+def test_validate_keeps_header_position(tmp_path):
+    report = RunReport()
+    process_excel(INPUT_FILE, TEMPLATE_FILE, str(tmp_path), report=report, validate=True)
+    checked = preflight(INPUT_FILE)
+    assert report.preflight["ok"]
+    assert report.preflight["header_row"] == checked.header_row
+    assert report.preflight["columns"] == checked.columns
@@ -0,0 +1,132 @@
+"""open_rows against openpyxl's values_only rows on hand-written sheet XML."""
+import io
+import zipfile
+
+import openpyxl
+import pytest
+
+from xlsx_reader import SheetRows, open_rows
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml"
+
+SHARED_STRINGS = ["Trip ID", "Driver Name", "Estimated Cost", "Ann Lee", "Bo Chen"]
+
+
+def xlsx(rows_xml, shared_strings=SHARED_STRINGS):
+    """An xlsx file with one sheet whose <sheetData> holds rows_xml."""
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as archive:
+        archive.writestr("[Content_Types].xml", (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            f'<Override PartName="/xl/workbook.xml" ContentType="{_CONTENT_TYPE}.sheet.main+xml"/>'
+            f'<Override PartName="/xl/worksheets/sheet1.xml" ContentType="{_CONTENT_TYPE}.worksheet+xml"/>'
+            f'<Override PartName="/xl/sharedStrings.xml" ContentType="{_CONTENT_TYPE}.sharedStrings+xml"/></Types>'
+        ))
+        archive.writestr("_rels/.rels", (
+            f'<Relationships xmlns="{_PKG_REL_NS}">'
+            f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/></Relationships>'
+        ))
+        archive.writestr("xl/workbook.xml", (
+            f'<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}">'
+            '<sheets><sheet name="Trips" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        archive.writestr("xl/_rels/workbook.xml.rels", (
+            f'<Relationships xmlns="{_PKG_REL_NS}">'
+            f'<Relationship Id="rId1" Type="{_REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+            f'<Relationship Id="rId2" Type="{_REL_NS}/sharedStrings" Target="sharedStrings.xml"/></Relationships>'
+        ))
+        archive.writestr("xl/sharedStrings.xml", (
+            f'<sst xmlns="{_MAIN_NS}" count="{len(shared_strings)}" uniqueCount="{len(shared_strings)}">'
+            + "".join(f"<si><t>{text}</t></si>" for text in shared_strings)
+            + "</sst>"
+        ))
+        archive.writestr("xl/worksheets/sheet1.xml", (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<worksheet xmlns="{_MAIN_NS}"><sheetData>{rows_xml}</sheetData></worksheet>'
+        ))
+    return data.getvalue()
+
+
+def openpyxl_rows(data):
+    workbook = openpyxl.load_workbook(io.BytesIO(data), read_only=True)
+    try:
+        worksheet = workbook.active
+        worksheet.reset_dimensions()
+        # Rows missing from the XML come back as [] rather than ().
+        return [tuple(row) for row in worksheet.iter_rows(values_only=True)]
+    finally:
+        workbook.close()
+
+
+def streamed_rows(data, columns=None):
+    with open_rows(io.BytesIO(data)) as rows:
+        assert isinstance(rows, SheetRows), "fell back to openpyxl"
+        rows.columns = columns
+        return list(rows)
+
+
+def project(rows, columns):
+    return [tuple(row[column] if column is not None and column < len(row) else None for column in columns) if row else () for row in rows]
+
+
+SHEETS = {
+    "mixed attribute order": (
+        '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c><c r="C1" t="s"><v>2</v></c></row>'
+        '<row r="2"><c s="1" r="A2"><v>101</v></c><c t="s" s="1" r="B2"><v>3</v></c><c s="2" r="C2"><v>12.5</v></c></row>'
+        # Back to references first: the projected fast path follows the fallback.
+        '<row r="3"><c r="A3"><v>102</v></c><c r="B3" t="s"><v>4</v></c><c r="C3"><v>7</v></c></row>'
+        '<row r="4"><c r="A4" s="3"><v>103</v></c><c r="C4"><v>1E-3</v></c></row>'
+    ),
+    "cells without references": (
+        '<row r="1"><c t="s"><v>0</v></c><c t="s"><v>1</v></c><c t="s"><v>2</v></c></row>'
+        '<row r="2"><c><v>101</v></c><c t="s"><v>3</v></c><c><v>9.75</v></c></row>'
+        '<row><c><v>102</v></c><c r="C3"><v>4</v></c></row>'
+        '<row r="4"><c r="A4"><v>103</v></c><c r="B4" t="s"><v>4</v></c><c r="C4"><v>5</v></c></row>'
+    ),
+    "inline strings": (
+        '<row r="1"><c r="A1" t="inlineStr"><is><t>Trip ID</t></is></c>'
+        '<c r="B1" t="inlineStr"><is><r><t>Driver</t></r><r><t xml:space="preserve"> Name</t></r></is></c>'
+        '<c r="C1" t="inlineStr"><is><t>Cost &amp; Fees</t><rPh sb="0" eb="1"><t>x</t></rPh></is></c></row>'
+        '<row r="2"><c r="A2" t="inlineStr"><is><t>T-1</t></is></c><c r="B2" t="inlineStr"><is><t/></is></c><c r="C2"><v>3</v></c></row>'
+    ),
+    "formulas": (
+        '<row r="1"><c r="A1"><v>1</v></c><c r="B1"><v>2</v></c><c r="C1"><f>A1+B1</f><v>3</v></c></row>'
+        '<row r="2"><c r="A2" t="str"><f>"a"&amp;"b"</f><v>ab</v></c><c r="B2" t="b"><v>1</v></c><c r="C2" t="e"><v>#N/A</v></c></row>'
+    ),
+    "self-closing and missing rows": (
+        '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="C1" t="s"><v>2</v></c></row>'
+        '<row r="2"/>'
+        '<row r="4" spans="1:3"><c r="B4"/><c r="C4"><v>8</v></c></row>'
+        '<row r="5"></row>'
+        '<row r="7"><c r="A7"><v>107</v></c></row>'
+    ),
+}
+
+
+@pytest.mark.parametrize("name", SHEETS)
+def test_rows_match_openpyxl(name):
+    data = xlsx(SHEETS[name])
+    assert streamed_rows(data) == openpyxl_rows(data)
+
+
+@pytest.mark.parametrize("name", SHEETS)
+@pytest.mark.parametrize("columns", [(0, 1, 2), (2, 0), (1, None, 5)])
+def test_projected_rows_match_openpyxl(name, columns):
+    data = xlsx(SHEETS[name])
+    assert streamed_rows(data, columns) == project(openpyxl_rows(data), columns)
+
+
+def test_projection_set_after_header():
+    data = xlsx(SHEETS["mixed attribute order"])
+    expected = openpyxl_rows(data)
+    with open_rows(io.BytesIO(data)) as rows:
+        header = next(rows)
+        rows.columns = (1, 2, 0)
+        body = list(rows)
+    assert header == expected[0]
+    assert body == project(expected[1:], (1, 2, 0))
@@ -0,0 +1,331 @@
+"""Column-projected row reader for xlsx exports.
+
+Trips and payment exports are wide (the trips export repeats a dozen
+"Stop N ..." columns per stop) but the engine needs a handful of columns.
+open_rows() streams the sheet XML straight out of the zip and, once the
+caller sets rows.columns to the indices it needs, decodes only those cells:
+ignored cells are skipped without converting their value or looking up
+their shared string.
+
+Cell styles are not applied, so date-formatted numbers come back as their
+serial number rather than a datetime. Sheets the reader cannot stream
+(namespace-prefixed XML, unusual structure) are read through openpyxl's
+read-only mode instead, with the same projection applied.
+"""
+import io
+import posixpath
+import re
+import zipfile
+from contextlib import ExitStack, contextmanager
+from html import unescape
+from xml.etree import ElementTree
+
+import openpyxl
+from openpyxl.utils.cell import column_index_from_string, get_column_letter
+
+# Sheet XML is decoded this many characters at a time.
+CHUNK_SIZE = 1 << 20
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_ROW_RE = re.compile(r'<row\b([^>]*?)(?:/>|>(.*?)</row>)', re.S)
+_CELL_RE = re.compile(r'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_REF_RE = re.compile(r'\br="([A-Z]*)(\d*)"')
+_TYPE_RE = re.compile(r'\bt="(\w+)"')
+_VALUE_RE = re.compile(r'<v>(.*?)</v>', re.S)
+_FORMULA_RE = re.compile(r'<f\b[^>]*>(.+?)</f>', re.S)
+_TEXT_RE = re.compile(r'<t\b[^>]*?(?:/>|>(.*?)</t>)', re.S)
+_PHONETIC_RE = re.compile(r'<rPh\b.*?</rPh>', re.S)
+
+
+class Unsupported(Exception):
+    """The sheet cannot be streamed by this reader."""
+
+
+def _number(text):
+    if "." in text or "E" in text or "e" in text:
+        return float(text)
+    return int(text)
+
+
+def _inline_text(xml):
+    return unescape("".join(text or "" for text in _TEXT_RE.findall(_PHONETIC_RE.sub("", xml))))
+
+
+def _cell_value(cell_type, body, shared_strings):
+    """Decodes a cell the way openpyxl's values_only reader does."""
+    if not body:
+        return None
+    if cell_type == "inlineStr":
+        return _inline_text(body)
+    if "<f" in body:
+        # openpyxl (without data_only) returns the formula, not its cached value.
+        formula = _FORMULA_RE.search(body)
+        if formula is not None:
+            return "=" + unescape(formula.group(1))
+    match = _VALUE_RE.search(body)
+    if match is None:
+        return None
+    text = match.group(1)
+    if cell_type == "s":
+        return shared_strings[int(text)]
+    if cell_type == "b":
+        return bool(int(text))
+    if cell_type in ("str", "e", "d"):
+        return unescape(text)
+    return _number(text)
+
+
+def _read_shared_strings(archive, path):
+    if path is None:
+        return []
+    strings = []
+    with archive.open(path) as f:
+        for _, element in ElementTree.iterparse(f):
+            if element.tag == f"{_MAIN_NS}si":
+                # Plain text is a <t> child, rich text <r> runs of <t>; <rPh> phonetic runs are not part of the value.
+                parts = []
+                for child in element:
+                    if child.tag == f"{_MAIN_NS}t":
+                        parts.append(child.text or "")
+                    elif child.tag == f"{_MAIN_NS}r":
+                        parts.extend(text.text or "" for text in child.iter(f"{_MAIN_NS}t"))
+                strings.append("".join(parts))
+                element.clear()
+    return strings
+
+
+def _part_paths(archive, sheet_name):
+    """Resolves the sheet and shared strings part names from workbook.xml."""
+    workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {}
+    shared_strings = None
+    for rel in rels.iter(f"{_PKG_REL_NS}Relationship"):
+        target = rel.get("Target")
+        target = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+        targets[rel.get("Id")] = target
+        if rel.get("Type", "").endswith("/sharedStrings"):
+            shared_strings = target
+
+    sheets = [(sheet.get("name"), sheet.get(f"{_REL_NS}id")) for sheet in workbook.iter(f"{_MAIN_NS}sheet")]
+    if not sheets:
+        raise Unsupported("Workbook has no sheets")
+    if sheet_name is not None:
+        matches = [rel_id for name, rel_id in sheets if name == sheet_name]
+        if not matches:
+            raise KeyError(f"Worksheet {sheet_name} does not exist.")
+        rel_id = matches[0]
+    else:
+        view = workbook.find(f"{_MAIN_NS}bookViews/{_MAIN_NS}workbookView")
+        active = int(view.get("activeTab", 0)) if view is not None else 0
+        rel_id = sheets[active if active < len(sheets) else 0][1]
+    return targets[rel_id], shared_strings
+
+
+class SheetRows:
+    """Iterator over the value tuples of one sheet, starting at row 1.
+
+    Missing and cell-less rows come back as empty tuples, like openpyxl's
+    values_only rows. While columns is None every cell is decoded; once it
+    is set to a tuple of 0-based column indices, each row is a tuple of
+    just those columns' values, in that order. A None index reads as None,
+    for optional columns the sheet does not have.
+    """
+
+    def __init__(self, stream, shared_strings):
+        self.columns = None
+        self._stream = stream
+        self._shared_strings = shared_strings
+        self._rows = self._iter_rows()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._rows)
+
+    def _iter_xml(self):
+        """Yields the sheet's <row> matches, a chunk of rows at a time."""
+        buffer = ""
+        started = False
+        while True:
+            chunk = self._stream.read(CHUNK_SIZE)
+            buffer += chunk
+            if not started:
+                start = buffer.find("<sheetData")
+                if start < 0:
+                    if not chunk:
+                        raise Unsupported("Sheet XML has no <sheetData>")
+                    continue
+                buffer = buffer[start:]
+                started = True
+            end = buffer.find("</sheetData>")
+            if end >= 0:
+                yield from _ROW_RE.finditer(buffer, 0, end)
+                return
+            if not chunk:
+                raise Unsupported("Sheet XML ends inside <sheetData>")
+            cut = buffer.rfind("</row>")
+            if cut >= 0:
+                cut += len("</row>")
+                yield from _ROW_RE.finditer(buffer, 0, cut)
+                buffer = buffer[cut:]
+
+    def _iter_rows(self):
+        shared_strings = self._shared_strings
+        column_cache = {}
+        row_number = 0
+        columns = wanted = None
+        for row in self._iter_xml():
+            ref = _REF_RE.search(row.group(1))
+            number = int(ref.group(2)) if ref else row_number + 1
+            while row_number + 1 < number:
+                row_number += 1
+                yield ()
+            row_number = number
+
+            if self.columns is not columns:
+                columns = self.columns
+                wanted = frozenset(columns) if columns is not None else None
+                letters = [get_column_letter(column + 1) if column is not None else None for column in columns] if columns is not None else None
+            cells = row.group(2)
+            if not cells or "<c" not in cells:
+                yield ()
+                continue
+
+            if columns is not None and cells.count("<c") == cells.count('<c r="'):
+                # Every cell leads with its reference, so the projected cells
+                # are found by reference and the rest are never looked at.
+                projected = []
+                for column_letters in letters:
+                    start = cells.find(f'<c r="{column_letters}{number}"') if column_letters else -1
+                    if start < 0:
+                        projected.append(None)
+                        continue
+                    cell = _CELL_RE.match(cells, start)
+                    cell_type = _TYPE_RE.search(cell.group(1))
+                    projected.append(_cell_value(cell_type.group(1) if cell_type else "n", cell.group(2), shared_strings))
+                yield tuple(projected)
+                continue
+
+            values = {}
+            column = -1
+            for cell in _CELL_RE.finditer(cells):
+                attrs = cell.group(1)
+                ref = _REF_RE.search(attrs)
+                if ref and ref.group(1):
+                    cell_letters = ref.group(1)
+                    column = column_cache.get(cell_letters)
+                    if column is None:
+                        column = column_cache[cell_letters] = column_index_from_string(cell_letters) - 1
+                else:
+                    column += 1
+                if wanted is not None and column not in wanted:
+                    continue
+                cell_type = _TYPE_RE.search(attrs)
+                values[column] = _cell_value(cell_type.group(1) if cell_type else "n", cell.group(2), shared_strings)
+
+            if columns is not None:
+                yield tuple(values.get(column) for column in columns)
+            else:
+                yield tuple(values.get(column) for column in range(max(values) + 1))
+
+
+class _ProjectedRows:
+    """openpyxl read-only rows behind the SheetRows interface."""
+
+    def __init__(self, rows):
+        self.columns = None
+        self._rows = rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = next(self._rows)
+        columns = self.columns
+        if columns is None or not row:
+            return row
+        width = len(row)
+        return tuple(row[column] if column is not None and column < width else None for column in columns)
+
+
+@contextmanager
+def _open_openpyxl(source, sheet_name):
+    workbook = openpyxl.load_workbook(source, read_only=True)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name is not None else workbook.active
+        # Exporters do not always write a correct <dimension>; read every row as stored.
+        worksheet.reset_dimensions()
+        yield _ProjectedRows(worksheet.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+class _Prepended:
+    """A text stream with already-read text put back in front."""
+
+    def __init__(self, head, stream):
+        self._head = head
+        self._stream = stream
+
+    def read(self, size):
+        if self._head:
+            head, self._head = self._head, ""
+            return head
+        return self._stream.read(size)
+
+
+@contextmanager
+def _open_streaming(source, sheet_name):
+    with zipfile.ZipFile(source) as archive:
+        sheet_path, shared_strings_path = _part_paths(archive, sheet_name)
+        shared_strings = _read_shared_strings(archive, shared_strings_path)
+        with archive.open(sheet_path) as raw, io.TextIOWrapper(raw, encoding="utf-8") as stream:
+            # Check for an unprefixed <sheetData> before any row is handed out.
+            head = ""
+            while "sheetData" not in head:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                head += chunk
+            if "<sheetData" not in head:
+                raise Unsupported("Sheet XML has no unprefixed <sheetData>")
+            yield SheetRows(_Prepended(head, stream), shared_strings)
+
+
+def sheet_names(source):
+    """Returns the sheet names of an xlsx file, in workbook order."""
+    with zipfile.ZipFile(source) as archive:
+        workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return [sheet.get("name") for sheet in workbook.iter(f"{_MAIN_NS}sheet")]
+
+
+@contextmanager
+def open_rows(source, sheet_name=None):
+    """Opens a sheet for column-projected reading.
+
+    Args:
+        source: Path or binary file-like object of an xlsx file.
+        sheet_name: Sheet to read; the active sheet if None.
+
+    Yields:
+        A SheetRows-like iterator of row value tuples with a settable
+        columns projection.
+
+    Raises:
+        KeyError: If there is no sheet called sheet_name.
+    """
+    with ExitStack() as stack:
+        try:
+            rows = stack.enter_context(_open_streaming(source, sheet_name))
+        except (Unsupported, zipfile.BadZipFile, ElementTree.ParseError):
+            if hasattr(source, "seek"):
+                source.seek(0)
+            rows = stack.enter_context(_open_openpyxl(source, sheet_name))
+        yield rows